@@ -2,16 +2,69 @@
 Rigid stitching algorithm for tissue fragment alignment
 """
 
+import os
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import numpy as np
 import cv2
-from typing import Dict, List, Tuple, Optional
-from scipy.optimize import minimize
+from typing import Callable, Dict, List, Tuple, Optional
+from scipy.optimize import least_squares
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
 from skimage import feature, measure
 from skimage.transform import AffineTransform
 import logging
 
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
 from ..core.fragment import Fragment
 
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _residual_kernel(params, pair_indices, pair_offsets, pts1, pts2):
+        """Fused residuals and Jacobian entries over all matched point pairs"""
+        num_pairs = pair_indices.shape[0]
+        num_points = pts1.shape[0]
+        residuals = np.empty(2 * num_points)
+        jac_data = np.empty((num_points, 2, 4))
+        deg_to_rad = np.pi / 180.0
+        
+        # One cos/sin per fragment, shared by every pair it takes part in
+        angles = params[2::3] * deg_to_rad
+        cos_a = np.cos(angles)
+        sin_a = np.sin(angles)
+        
+        for p in prange(num_pairs):
+            i = pair_indices[p, 0]
+            j = pair_indices[p, 1]
+            tx1, ty1 = params[3 * i], params[3 * i + 1]
+            tx2, ty2 = params[3 * j], params[3 * j + 1]
+            c1, s1 = cos_a[i], sin_a[i]
+            c2, s2 = cos_a[j], sin_a[j]
+            
+            for k in range(pair_offsets[p], pair_offsets[p + 1]):
+                x1, y1 = pts1[k, 0], pts1[k, 1]
+                x2, y2 = pts2[k, 0], pts2[k, 1]
+                residuals[2 * k] = (x1 * c1 - y1 * s1 + tx1) - (x2 * c2 - y2 * s2 + tx2)
+                residuals[2 * k + 1] = (x1 * s1 + y1 * c1 + ty1) - (x2 * s2 + y2 * c2 + ty2)
+                
+                # Columns: [t_i, theta_i, t_j, theta_j] for the x and y rows
+                jac_data[k, 0, 0] = 1.0
+                jac_data[k, 0, 1] = (-s1 * x1 - c1 * y1) * deg_to_rad
+                jac_data[k, 0, 2] = -1.0
+                jac_data[k, 0, 3] = (s2 * x2 + c2 * y2) * deg_to_rad
+                jac_data[k, 1, 0] = 1.0
+                jac_data[k, 1, 1] = (c1 * x1 - s1 * y1) * deg_to_rad
+                jac_data[k, 1, 2] = -1.0
+                jac_data[k, 1, 3] = (s2 * y2 - c2 * x2) * deg_to_rad
+                
+        return residuals, jac_data
+
 class RigidStitchingAlgorithm:
     """
     Rigid stitching algorithm that refines fragment positions using feature matching
@@ -21,27 +74,50 @@ class RigidStitchingAlgorithm:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         
-        # Feature detection parameters
-        self.feature_detector = cv2.SIFT_create(nfeatures=1000)
-        self.matcher = cv2.BFMatcher()
+        # Feature detection parameters (SIFT detectors are created per worker
+        # thread since a single instance is not safe for concurrent calls)
+        self.sift_nfeatures = 1000
+        self.max_workers = os.cpu_count() or 1
+        self.max_feature_image_size = 1024  # Downsample larger images before SIFT
+        
+        # Run SIFT through OpenCV's OpenCL (T-API) backend when a device is present
+        self.use_opencl = cv2.ocl.haveOpenCL()
+        if self.use_opencl:
+            cv2.ocl.setUseOpenCL(True)
+            
+        # Extracted features keyed by image content + transform, reused across runs
+        self._feature_cache: Dict[str, dict] = {}
+        self.feature_cache_size = 64
+        self._feature_cache_lock = threading.Lock()  # extract_features runs on worker threads
+        self._thread_local = threading.local()
+        
+        # FLANN matcher with randomized KD-trees (SIFT descriptors are float)
+        FLANN_INDEX_KDTREE = 1
+        self.flann_index_params = dict(algorithm=FLANN_INDEX_KDTREE, trees=5)
+        self.flann_search_params = dict(checks=50)
         
         # Matching parameters
         self.match_ratio_threshold = 0.7
+        self.global_match_neighbors = 8
+        self.global_match_max_neighbors = 64  # Widest retry for queries crowded by their own fragment
         self.min_matches = 10
         self.ransac_threshold = 5.0
+        self.overlap_tolerance = 0.2  # Bounding box inflation, fraction of min dimension
         
         # Optimization parameters
         self.max_iterations = 1000
         self.convergence_threshold = 1e-6
         
     def stitch_fragments(self, fragments: List[Fragment], 
-                        initial_transforms: Dict[str, dict]) -> Dict[str, dict]:
+                        initial_transforms: Dict[str, dict],
+                        progress_callback: Optional[Callable[[int, int], None]] = None) -> Dict[str, dict]:
         """
         Perform rigid stitching refinement on fragments
         
         Args:
             fragments: List of Fragment objects
             initial_transforms: Dictionary of initial transform parameters
+            progress_callback: Optional callable receiving (completed, total) stages
             
         Returns:
             Dictionary of refined transform parameters
@@ -52,12 +128,22 @@ class RigidStitchingAlgorithm:
             
         self.logger.info(f"Starting rigid stitching with {len(fragments)} fragments")
         
+        def report(stage: int):
+            if progress_callback is not None:
+                progress_callback(stage, 3)
+                
         try:
+            report(0)
+            
             # Extract features from all fragments
             fragment_features = self.extract_all_features(fragments)
+            report(1)
             
             # Find pairwise matches
-            pairwise_matches = self.find_pairwise_matches(fragments, fragment_features)
+            pairwise_matches = self.find_pairwise_matches(
+                fragments, fragment_features, initial_transforms
+            )
+            report(2)
             
             if not pairwise_matches:
                 self.logger.warning("No feature matches found between fragments")
@@ -67,6 +153,7 @@ class RigidStitchingAlgorithm:
             refined_transforms = self.optimize_transforms(
                 fragments, pairwise_matches, initial_transforms
             )
+            report(3)
             
             self.logger.info("Rigid stitching completed successfully")
             return refined_transforms
@@ -76,135 +163,456 @@ class RigidStitchingAlgorithm:
             return initial_transforms
             
     def extract_all_features(self, fragments: List[Fragment]) -> Dict[str, dict]:
-        """Extract features from all fragments"""
+        """Extract features from all fragments in parallel"""
         fragment_features = {}
         
-        for fragment in fragments:
-            if not fragment.visible or fragment.image_data is None:
-                continue
-                
-            try:
-                features = self.extract_features(fragment)
-                if features['keypoints'] is not None and len(features['keypoints']) > 0:
-                    fragment_features[fragment.id] = features
-                    self.logger.debug(f"Extracted {len(features['keypoints'])} features from {fragment.name}")
-                else:
-                    self.logger.warning(f"No features found in fragment {fragment.name}")
-                    
-            except Exception as e:
-                self.logger.error(f"Feature extraction failed for {fragment.name}: {str(e)}")
+        candidates = [f for f in fragments if f.visible and f.original_image_data is not None]
+        if not candidates:
+            return fragment_features
+            
+        # Largest images first so each worker's detector sizes its internal
+        # pyramid buffers once and reuses them for the smaller fragments
+        by_area = sorted(candidates, key=lambda f: f.original_size[0] * f.original_size[1], reverse=True)
+        
+        # SIFT releases the GIL, so a thread pool scales across cores. Keep
+        # OpenCV single-threaded meanwhile so it doesn't oversubscribe them.
+        previous_num_threads = cv2.getNumThreads()
+        cv2.setNumThreads(1)
+        try:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(candidates))) as executor:
+                futures = {executor.submit(self.extract_features, fragment): fragment
+                           for fragment in by_area}
                 
-        return fragment_features
+                for future in as_completed(futures):
+                    fragment = futures[future]
+                    try:
+                        features = future.result()
+                        if features['keypoints'] is not None and len(features['keypoints']) > 0:
+                            fragment_features[fragment.id] = features
+                            self.logger.debug(f"Extracted {len(features['keypoints'])} features from {fragment.name}")
+                        else:
+                            self.logger.warning(f"No features found in fragment {fragment.name}")
+                        
+                    except Exception as e:
+                        self.logger.error(f"Feature extraction failed for {fragment.name}: {str(e)}")
+        finally:
+            cv2.setNumThreads(previous_num_threads)
+            
+        # Preserve the input fragment order for pairwise matching
+        return {f.id: fragment_features[f.id] for f in candidates if f.id in fragment_features}
+        
+    def get_feature_detector(self) -> cv2.SIFT:
+        """Get the SIFT detector for the calling thread"""
+        detector = getattr(self._thread_local, 'feature_detector', None)
+        if detector is None:
+            detector = cv2.SIFT_create(nfeatures=self.sift_nfeatures)
+            self._thread_local.feature_detector = detector
+        return detector
         
     def extract_features(self, fragment: Fragment) -> dict:
-        """Extract SIFT features from a fragment"""
-        # Get transformed image
-        image = fragment.get_transformed_image()
-        if image is None:
+        """Extract SIFT features from a fragment (memoized across stitching runs)"""
+        cache_key = self.get_feature_cache_key(fragment)
+        if cache_key is not None:
+            with self._feature_cache_lock:
+                cached_features = self._feature_cache.get(cache_key)
+            if cached_features is not None:
+                return {**cached_features,
+                        'descriptors': self.dequantize_descriptors(cached_features['descriptors'])}
+                
+        # Get transformed grayscale image (cached on the fragment)
+        gray = fragment.get_gray_image()
+        if gray is None:
             return {'keypoints': None, 'descriptors': None}
             
-        # Convert to grayscale if needed
-        if len(image.shape) == 3:
-            gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
-        else:
-            gray = image
+        image_shape = gray.shape
+        
+        # SIFT is scale invariant, so detect on a reduced pyramid level
+        scale = 1.0
+        while max(gray.shape[:2]) > self.max_feature_image_size:
+            gray = cv2.pyrDown(gray)
+            scale *= 2.0
             
         # Detect features
-        keypoints, descriptors = self.feature_detector.detectAndCompute(gray, None)
+        keypoints, descriptors = self.detect_and_compute(gray)
+        
+        # Keep keypoint coordinates as a single (N, 2) array so matched points
+        # can be gathered by index instead of reading KeyPoint.pt one by one
+        pts = np.array([kp.pt for kp in keypoints], dtype=np.float32).reshape(-1, 2)
+        
+        # Map keypoints back to full-resolution image coordinates
+        if scale > 1.0:
+            pts *= scale
+            for kp, pt in zip(keypoints, pts):
+                kp.pt = (float(pt[0]), float(pt[1]))
+                kp.size *= scale
+        if descriptors is not None:
+            descriptors = self.to_root_sift(descriptors)
         
-        return {
+        # Keypoint centroid, used as the rotation pivot during optimization
+        centroid = pts.mean(axis=0, dtype=np.float64) if len(pts) else np.zeros(2)
+        
+        features = {
             'keypoints': keypoints,
+            'pts': pts,
+            'centroid': centroid,
             'descriptors': descriptors,
-            'image_shape': gray.shape
+            'image_shape': image_shape,
+            'scale': scale
         }
         
+        if cache_key is not None:
+            # Only the cached copy is quantized; matching runs on float32
+            cached_features = {**features, 'descriptors': self.quantize_descriptors(descriptors)}
+            
+            # Drop the oldest entry once the cache is full
+            with self._feature_cache_lock:
+                if len(self._feature_cache) >= self.feature_cache_size:
+                    self._feature_cache.pop(next(iter(self._feature_cache)), None)
+                self._feature_cache[cache_key] = cached_features
+            
+        return features
+        
+    def get_feature_cache_key(self, fragment: Fragment) -> Optional[str]:
+        """
+        Get the feature cache key for a fragment's current image
+        
+        Hashes a strided grid of the original pixels (all channels, constant
+        time), the image shape, the rotation/flip state and the detector
+        settings the features depend on.
+        """
+        image = fragment.original_image_data
+        if image is None:
+            return None
+            
+        # About 64 x 64 sampled pixels whatever the image size
+        step = max(1, int(np.sqrt(image.shape[0] * image.shape[1]) // 64))
+        sample = np.ascontiguousarray(image[::step, ::step])
+        digest = hashlib.blake2b(sample.tobytes(), digest_size=16)
+        digest.update(repr((image.shape, image.dtype.str, round(fragment.rotation, 2),
+                            fragment.flip_horizontal, fragment.flip_vertical,
+                            self.sift_nfeatures, self.max_feature_image_size,
+                            self.use_opencl)).encode())
+        return digest.hexdigest()
+        
+    def detect_and_compute(self, gray: np.ndarray) -> Tuple[tuple, Optional[np.ndarray]]:
+        """Run SIFT on the OpenCL device if available, falling back to the CPU"""
+        detector = self.get_feature_detector()
+        
+        if self.use_opencl:
+            try:
+                keypoints, descriptors = detector.detectAndCompute(cv2.UMat(gray), None)
+                if isinstance(descriptors, cv2.UMat):
+                    descriptors = descriptors.get()
+                return keypoints, descriptors
+            except cv2.error as e:
+                self.logger.warning(f"OpenCL feature detection failed, using CPU: {str(e)}")
+                
+        return detector.detectAndCompute(gray, None)
+        
+    def to_root_sift(self, descriptors: np.ndarray) -> np.ndarray:
+        """Convert SIFT descriptors to RootSIFT (L1-normalize, then square root)
+        
+        L2 distance between RootSIFT descriptors equals the Hellinger distance
+        between the original histograms, which gives more reliable matches
+        with the same matcher.
+        """
+        descriptors = descriptors.astype(np.float32, copy=False)
+        descriptors = descriptors / (descriptors.sum(axis=1, keepdims=True) + 1e-7)
+        return np.sqrt(descriptors)
+        
+    def quantize_descriptors(self, descriptors: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        """Quantize unit-norm descriptors to uint8 (x512, as SIFT itself does)"""
+        if descriptors is None:
+            return None
+        return np.ascontiguousarray(np.clip(np.rint(descriptors * 512.0), 0, 255), dtype=np.uint8)
+        
+    def dequantize_descriptors(self, descriptors: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        """Widen quantized descriptors back to unit-norm float32"""
+        if descriptors is None:
+            return None
+        return descriptors.astype(np.float32) * np.float32(1.0 / 512.0)
+        
     def find_pairwise_matches(self, fragments: List[Fragment], 
-                            fragment_features: Dict[str, dict]) -> List[dict]:
-        """Find feature matches between all pairs of fragments"""
+                            fragment_features: Dict[str, dict],
+                            initial_transforms: Optional[Dict[str, dict]] = None) -> List[dict]:
+        """Find feature matches between all pairs of spatially overlapping fragments"""
         pairwise_matches = []
         fragment_ids = list(fragment_features.keys())
+        fragments_by_id = {f.id: f for f in fragments}
         
+        # World bounds at the current position guess, used to skip distant pairs
+        initial_transforms = initial_transforms or {}
+        world_bounds = [
+            self.get_world_bounds(fragments_by_id[frag_id], initial_transforms.get(frag_id))
+            for frag_id in fragment_ids
+        ]
+        overlap = np.zeros((len(fragment_ids), len(fragment_ids)), dtype=bool)
         for i in range(len(fragment_ids)):
             for j in range(i + 1, len(fragment_ids)):
-                id1, id2 = fragment_ids[i], fragment_ids[j]
-                
-                matches = self.match_features(
-                    fragment_features[id1], 
-                    fragment_features[id2]
-                )
+                if self.bounds_overlap(world_bounds[i], world_bounds[j]):
+                    overlap[i, j] = overlap[j, i] = True
+        
+        all_matches = self.match_all_features(fragment_ids, fragment_features, overlap)
+        
+        for (i, j), matches in sorted(all_matches.items()):
+            if len(matches) < self.min_matches:
+                continue
                 
-                if matches and len(matches) >= self.min_matches:
-                    # Get fragment objects
-                    frag1 = next(f for f in fragments if f.id == id1)
-                    frag2 = next(f for f in fragments if f.id == id2)
-                    
-                    pairwise_matches.append({
-                        'fragment1_id': id1,
-                        'fragment2_id': id2,
-                        'fragment1': frag1,
-                        'fragment2': frag2,
-                        'matches': matches,
-                        'features1': fragment_features[id1],
-                        'features2': fragment_features[id2]
-                    })
-                    
-                    self.logger.debug(f"Found {len(matches)} matches between {frag1.name} and {frag2.name}")
+            id1, id2 = fragment_ids[i], fragment_ids[j]
+            frag1 = fragments_by_id[id1]
+            frag2 = fragments_by_id[id2]
+            
+            # Gather matched keypoint coordinates once for the optimizer
+            query_idx = np.fromiter((m.queryIdx for m in matches), dtype=np.intp, count=len(matches))
+            train_idx = np.fromiter((m.trainIdx for m in matches), dtype=np.intp, count=len(matches))
+            pts1 = fragment_features[id1]['pts'][query_idx].astype(np.float64)
+            pts2 = fragment_features[id2]['pts'][train_idx].astype(np.float64)
+            
+            # Keep only matches consistent with one similarity transform; the
+            # optimizer's loss tolerates the odd outlier, not a third of them
+            _, inliers = cv2.estimateAffinePartial2D(pts2, pts1, method=cv2.RANSAC,
+                                                     ransacReprojThreshold=self.ransac_threshold)
+            if inliers is None or inliers.sum() < self.min_matches:
+                continue
+            inliers = inliers.ravel().astype(bool)
+            matches = [m for m, keep in zip(matches, inliers) if keep]
+            pts1, pts2 = pts1[inliers], pts2[inliers]
+            
+            # Keypoints relative to each fragment's centroid keep rotation
+            # and translation on comparable scales for the optimizer
+            centroid1 = fragment_features[id1]['centroid']
+            centroid2 = fragment_features[id2]['centroid']
+            
+            pairwise_matches.append({
+                'fragment1_id': id1,
+                'fragment2_id': id2,
+                'fragment1': frag1,
+                'fragment2': frag2,
+                'matches': matches,
+                'pts1': pts1,
+                'pts2': pts2,
+                'centroid1': centroid1,
+                'centroid2': centroid2,
+                'pts1_centered': pts1 - centroid1,
+                'pts2_centered': pts2 - centroid2,
+                'features1': fragment_features[id1],
+                'features2': fragment_features[id2]
+            })
+            
+            self.logger.debug(f"Found {len(matches)} matches between {frag1.name} and {frag2.name}")
                     
         self.logger.info(f"Found {len(pairwise_matches)} fragment pairs with sufficient matches")
         return pairwise_matches
         
-    def match_features(self, features1: dict, features2: dict) -> Optional[List]:
-        """Match features between two fragments"""
-        if (features1['descriptors'] is None or features2['descriptors'] is None or
-            len(features1['descriptors']) < 2 or len(features2['descriptors']) < 2):
-            return None
+    def match_all_features(self, fragment_ids: List[str], fragment_features: Dict[str, dict],
+                           overlap: np.ndarray) -> Dict[Tuple[int, int], List]:
+        """Match every fragment against all overlapping fragments with one global FLANN index.
+        
+        Returns matches keyed by fragment index pairs (i, j) with i < j, where
+        queryIdx refers to fragment i's descriptors and trainIdx to fragment j's.
+        """
+        descriptor_sets = []
+        owners = []
+        for index, frag_id in enumerate(fragment_ids):
+            descriptors = fragment_features[frag_id]['descriptors']
+            if descriptors is None or len(descriptors) < 2:
+                continue
+            descriptor_sets.append(descriptors)
+            owners.append(np.full(len(descriptors), index, dtype=np.intp))
             
+        if len(descriptor_sets) < 2:
+            return {}
+            
+        # Row -> owning fragment index and row -> descriptor index within that fragment
+        owner = np.concatenate(owners)
+        local_idx = np.concatenate([np.arange(len(d), dtype=np.intp) for d in descriptor_sets])
+        all_desc = np.vstack(descriptor_sets).astype(np.float32, copy=False)
+        
         try:
-            # Find matches using FLANN matcher
-            matches = self.matcher.knnMatch(features1['descriptors'], features2['descriptors'], k=2)
-            
-            # Apply ratio test
-            good_matches = []
-            for match_pair in matches:
-                if len(match_pair) == 2:
-                    m, n = match_pair
-                    if m.distance < self.match_ratio_threshold * n.distance:
-                        good_matches.append(m)
-                        
-            return good_matches if len(good_matches) >= self.min_matches else None
+            # One KD-forest over every descriptor; each query's nearest neighbours
+            # include itself and others from its own fragment, so ask for a few
+            # extra and keep the two nearest from overlapping fragments
+            index = cv2.flann.Index(all_desc, self.flann_index_params)
+            k = min(self.global_match_neighbors, len(all_desc))
+            neighbor_idx, neighbor_dist = index.knnSearch(all_desc, k, params=self.flann_search_params)
+            has_pair, train_first, d1, d2 = self._nearest_cross_pair(
+                owner, np.arange(len(all_desc)), neighbor_idx, neighbor_dist, overlap
+            )
             
-        except Exception as e:
+            # On repetitive texture a query's own fragment can fill all k slots;
+            # search those queries again with a widening k
+            has_partner = overlap[owner].any(axis=1)
+            starved = np.flatnonzero(~has_pair & has_partner)
+            k_max = min(self.global_match_max_neighbors, len(all_desc))
+            while starved.size and k < k_max:
+                k = min(2 * k, k_max)
+                neighbor_idx, neighbor_dist = index.knnSearch(all_desc[starved], k,
+                                                              params=self.flann_search_params)
+                retry = self._nearest_cross_pair(owner, starved, neighbor_idx, neighbor_dist, overlap)
+                has_pair[starved], train_first[starved], d1[starved], d2[starved] = retry
+                starved = starved[~retry[0]]
+        except cv2.error as e:
             self.logger.error(f"Feature matching failed: {str(e)}")
-            return None
+            return {}
             
+        if starved.size:
+            self.logger.info(f"{starved.size} of {int(has_partner.sum())} descriptors found fewer "
+                             f"than two neighbours in overlapping fragments within k={k}")
+        
+        accepted = np.flatnonzero(has_pair & (d1 < self.match_ratio_threshold * d2))
+        
+        query_rows = accepted
+        train_rows = train_first[accepted]
+        distances = d1[accepted]
+        
+        # Orient every match from the lower to the higher fragment index; a
+        # descriptor pair found from both sides is only kept once
+        flip = owner[query_rows] > owner[train_rows]
+        rows_a = np.where(flip, train_rows, query_rows)
+        rows_b = np.where(flip, query_rows, train_rows)
+        _, unique = np.unique(rows_a * len(all_desc) + rows_b, return_index=True)
+        
+        all_matches: Dict[Tuple[int, int], List] = {}
+        for m in unique:
+            a, b = rows_a[m], rows_b[m]
+            all_matches.setdefault((int(owner[a]), int(owner[b])), []).append(
+                cv2.DMatch(int(local_idx[a]), int(local_idx[b]), float(distances[m]))
+            )
+        return all_matches
+        
+    def _nearest_cross_pair(self, owner: np.ndarray, query_rows: np.ndarray,
+                            neighbor_idx: np.ndarray, neighbor_dist: np.ndarray,
+                            overlap: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Two nearest neighbours of each query that lie in overlapping fragments
+        
+        Returns (has_pair, first neighbour row, first distance, second distance)
+        per query; the last three are meaningless where has_pair is False.
+        """
+        neighbor_idx = neighbor_idx.astype(np.intp)
+        in_range = neighbor_idx >= 0
+        neighbor_owner = owner[np.where(in_range, neighbor_idx, 0)]
+        valid = in_range & overlap[owner[query_rows][:, None], neighbor_owner]
+        
+        # Column positions of the first and second valid neighbour of each query
+        rank = np.cumsum(valid, axis=1)
+        has_pair = rank[:, -1] >= 2
+        first_col = np.argmax(valid & (rank == 1), axis=1)
+        second_col = np.argmax(valid & (rank == 2), axis=1)
+        
+        # KD-tree distances are squared L2
+        rows = np.arange(len(query_rows))
+        d1 = np.sqrt(neighbor_dist[rows, first_col])
+        d2 = np.sqrt(neighbor_dist[rows, second_col])
+        return has_pair, neighbor_idx[rows, first_col], d1, d2
+        
+    def get_world_bounds(self, fragment: Fragment,
+                         transform: Optional[dict] = None) -> Tuple[float, float, float, float]:
+        """Get a fragment's world bounding box (min_x, min_y, max_x, max_y), inflated by the overlap tolerance"""
+        _, _, width, height = fragment.get_bounding_box()
+        if transform is not None:
+            x, y = transform['translation']
+        else:
+            x, y = fragment.x, fragment.y
+            
+        margin = self.overlap_tolerance * min(width, height)
+        return (x - margin, y - margin, x + width + margin, y + height + margin)
+        
+    def bounds_overlap(self, bounds1: Tuple[float, float, float, float],
+                       bounds2: Tuple[float, float, float, float]) -> bool:
+        """Check if two (min_x, min_y, max_x, max_y) boxes intersect"""
+        return (bounds1[0] <= bounds2[2] and bounds2[0] <= bounds1[2] and
+                bounds1[1] <= bounds2[3] and bounds2[1] <= bounds1[3])
+        
     def optimize_transforms(self, fragments: List[Fragment], 
                           pairwise_matches: List[dict],
                           initial_transforms: Dict[str, dict]) -> Dict[str, dict]:
-        """Optimize fragment transforms using feature matches"""
+        """Optimize fragment transforms using feature matches (sparse least squares)"""
         
         # Create parameter vector from initial transforms
-        fragment_ids = [f.id for f in fragments if f.visible]
-        initial_params = self.transforms_to_params(initial_transforms, fragment_ids)
+        visible_fragments = [f for f in fragments if f.visible]
+        fragment_ids = [f.id for f in visible_fragments]
+        origin_params = self.transforms_to_params(initial_transforms, fragment_ids)
+        
+        # Pack all matches into flat arrays once
+        packed_matches = self.pack_pairwise_matches(fragment_ids, pairwise_matches)
+        num_points = len(packed_matches[2])
+        if num_points == 0:
+            self.logger.warning("No matches between optimizable fragments")
+            return initial_transforms
+            
+        # Optimize each fragment's rotation about its keypoint centroid, with the
+        # translation parameter being the centroid's world position. This
+        # decouples rotation from translation and conditions the problem.
+        centroids = self.get_fragment_centroids(fragment_ids, pairwise_matches)
+        initial_params = self.pivot_params(origin_params, centroids, to_centroid=True)
+        
+        # Matches only constrain fragments relative to each other, so hold one
+        # anchor per connected group at its initial pose; the rest are solved for
+        anchors = self.get_anchor_fragments(visible_fragments, packed_matches[0])
+        free = np.zeros(len(fragment_ids), dtype=bool)
+        free[packed_matches[0].ravel()] = True
+        free[anchors] = False
+        free_cols = (3 * np.flatnonzero(free)[:, None] + np.arange(3)).ravel()
+            
+        # Each residual only depends on its pair's two fragments, so the
+        # Jacobian has a fixed sparsity pattern with 4 entries per row; the
+        # anchors' entries are dropped and the remaining columns renumbered
+        jac_indices, jac_indptr = self.build_jacobian_structure(*packed_matches[:2])
+        column_map = np.full(len(initial_params), -1, dtype=np.int64)
+        column_map[free_cols] = np.arange(len(free_cols))
+        mapped_indices = column_map[jac_indices]
+        kept = mapped_indices >= 0
+        jac_indices = mapped_indices[kept]
+        jac_indptr = np.concatenate(([0], np.cumsum(kept.reshape(-1, 4).sum(axis=1))))
+        jac_shape = (2 * num_points, len(free_cols))
+        compute_residuals = _residual_kernel if NUMBA_AVAILABLE else self.compute_residuals
+        
+        def full_params(x):
+            params = initial_params.copy()
+            params[free_cols] = x
+            return params
+        
+        # least_squares evaluates fun and jac at the same point; share one pass
+        last_evaluation = {}
         
-        # Define objective function
-        def objective(params):
-            return self.compute_alignment_error(params, fragment_ids, pairwise_matches)
+        def evaluate(x):
+            if last_evaluation.get('x') is None or not np.array_equal(last_evaluation['x'], x):
+                last_evaluation['x'] = x.copy()
+                last_evaluation['result'] = compute_residuals(full_params(x), *packed_matches)
+            return last_evaluation['result']
+            
+        def residuals(x):
+            return evaluate(x)[0]
+            
+        def jacobian(x):
+            return csr_matrix((evaluate(x)[1].ravel()[kept], jac_indices, jac_indptr), shape=jac_shape)
             
         # Optimize
         try:
-            result = minimize(
-                objective,
-                initial_params,
-                method='L-BFGS-B',
-                options={
-                    'maxiter': self.max_iterations,
-                    'ftol': self.convergence_threshold
-                }
+            result = least_squares(
+                residuals,
+                initial_params[free_cols],
+                jac=jacobian,
+                method='trf',
+                x_scale='jac',
+                tr_solver='lsmr',
+                # Outlier matches grow linearly past ransac_threshold, like the
+                # summed match distances this replaced, rather than quadratically
+                loss='soft_l1',
+                f_scale=self.ransac_threshold,
+                max_nfev=self.max_iterations,
+                ftol=self.convergence_threshold
             )
             
             if result.success:
-                self.logger.info(f"Optimization converged after {result.nit} iterations")
-                optimized_transforms = self.params_to_transforms(result.x, fragment_ids)
+                optimized_params = self.pivot_params(full_params(result.x), centroids, to_centroid=False)
+                # Fixed fragments keep their input pose exactly, not a pivot round trip
+                fixed_cols = np.setdiff1d(np.arange(len(origin_params)), free_cols)
+                optimized_params[fixed_cols] = origin_params[fixed_cols]
+                mean_error = self.compute_alignment_error(optimized_params, fragment_ids, pairwise_matches)
+                self.logger.info(f"Optimization converged after {result.nfev} evaluations "
+                                 f"(mean match distance {mean_error:.2f} px)")
+                optimized_transforms = self.params_to_transforms(optimized_params, fragment_ids)
                 return {**initial_transforms, **optimized_transforms}
             else:
                 self.logger.warning(f"Optimization failed: {result.message}")
@@ -214,109 +622,213 @@ class RigidStitchingAlgorithm:
             self.logger.error(f"Optimization failed: {str(e)}")
             return initial_transforms
             
+    def get_anchor_fragments(self, fragments: List[Fragment],
+                             pair_indices: np.ndarray) -> np.ndarray:
+        """Pick the largest fragment of each group connected by matches
+        
+        Returns the anchors' parameter rows; fragments without matches are
+        in no group and get no anchor.
+        """
+        num_fragments = len(fragments)
+        adjacency = csr_matrix((np.ones(len(pair_indices)), (pair_indices[:, 0], pair_indices[:, 1])),
+                               shape=(num_fragments, num_fragments))
+        _, labels = connected_components(adjacency, directed=False)
+        
+        matched = np.zeros(num_fragments, dtype=bool)
+        matched[pair_indices.ravel()] = True
+        areas = np.array([f.get_bounding_box()[2] * f.get_bounding_box()[3] for f in fragments],
+                         dtype=np.float64)
+        
+        # Largest area first, earlier fragments winning ties
+        order = np.lexsort((np.arange(num_fragments), -areas))
+        order = order[matched[order]]
+        _, first = np.unique(labels[order], return_index=True)
+        return np.sort(order[first])
+        
+    def get_fragment_centroids(self, fragment_ids: List[str],
+                               pairwise_matches: List[dict]) -> np.ndarray:
+        """Get the keypoint centroid of each fragment as an (F, 2) array"""
+        fragment_index = {frag_id: i for i, frag_id in enumerate(fragment_ids)}
+        centroids = np.zeros((len(fragment_ids), 2))
+        
+        for match_data in pairwise_matches:
+            for key in ('1', '2'):
+                row = fragment_index.get(match_data['fragment' + key + '_id'])
+                if row is not None:
+                    centroids[row] = match_data['centroid' + key]
+                    
+        return centroids
+        
+    def pivot_params(self, params: np.ndarray, centroids: np.ndarray,
+                     to_centroid: bool) -> np.ndarray:
+        """
+        Convert translations between origin-pivot and centroid-pivot form
+        
+        A point p maps to R p + t, or equivalently R (p - c) + T with
+        T = t + R c, the world position of the centroid c.
+        """
+        poses = params.reshape(-1, 3).copy()
+        angle = np.radians(poses[:, 2])
+        cos_a, sin_a = np.cos(angle), np.sin(angle)
+        rotated_x = centroids[:, 0] * cos_a - centroids[:, 1] * sin_a
+        rotated_y = centroids[:, 0] * sin_a + centroids[:, 1] * cos_a
+        
+        sign = 1.0 if to_centroid else -1.0
+        poses[:, 0] += sign * rotated_x
+        poses[:, 1] += sign * rotated_y
+        return poses.ravel()
+        
+    def build_jacobian_structure(self, pair_indices: np.ndarray,
+                                 pair_offsets: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Build CSR column indices and row pointers for the residual Jacobian"""
+        counts = np.diff(pair_offsets)
+        rows_i = np.repeat(pair_indices[:, 0], counts)
+        rows_j = np.repeat(pair_indices[:, 1], counts)
+        
+        # x residual -> (x_i, theta_i, x_j, theta_j), y residual -> (y_i, theta_i, y_j, theta_j)
+        indices = np.empty((len(rows_i), 2, 4), dtype=np.int64)
+        indices[:, 0] = np.stack([3 * rows_i, 3 * rows_i + 2, 3 * rows_j, 3 * rows_j + 2], axis=1)
+        indices[:, 1] = np.stack([3 * rows_i + 1, 3 * rows_i + 2, 3 * rows_j + 1, 3 * rows_j + 2], axis=1)
+        indptr = np.arange(0, indices.size + 1, 4, dtype=np.int64)
+        
+        return indices.ravel(), indptr
+        
+    def compute_residuals(self, params: np.ndarray, pair_indices: np.ndarray,
+                          pair_offsets: np.ndarray, pts1: np.ndarray,
+                          pts2: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Compute per-match residuals and their Jacobian entries
+        
+        Returns:
+            (residuals, jac_data) where residuals interleaves the x/y world-space
+            differences of every match (length 2M) and jac_data holds the four
+            non-zero derivatives of each residual row, shaped (M, 2, 4)
+        """
+        poses = params.reshape(-1, 3)
+        counts = np.diff(pair_offsets)
+        rows_i = np.repeat(pair_indices[:, 0], counts)
+        rows_j = np.repeat(pair_indices[:, 1], counts)
+        
+        # Trig per fragment (F values), then gathered per match
+        angles = np.radians(poses[:, 2])
+        cos_a, sin_a = np.cos(angles), np.sin(angles)
+        c1, s1 = cos_a[rows_i], sin_a[rows_i]
+        c2, s2 = cos_a[rows_j], sin_a[rows_j]
+        x1, y1 = pts1[:, 0], pts1[:, 1]
+        x2, y2 = pts2[:, 0], pts2[:, 1]
+        
+        residuals = np.empty((len(pts1), 2))
+        residuals[:, 0] = (x1 * c1 - y1 * s1 + poses[rows_i, 0]) - (x2 * c2 - y2 * s2 + poses[rows_j, 0])
+        residuals[:, 1] = (x1 * s1 + y1 * c1 + poses[rows_i, 1]) - (x2 * s2 + y2 * c2 + poses[rows_j, 1])
+        
+        deg_to_rad = np.pi / 180.0
+        jac_data = np.empty((len(pts1), 2, 4))
+        jac_data[:, :, 0] = 1.0
+        jac_data[:, :, 2] = -1.0
+        jac_data[:, 0, 1] = (-s1 * x1 - c1 * y1) * deg_to_rad
+        jac_data[:, 0, 3] = (s2 * x2 + c2 * y2) * deg_to_rad
+        jac_data[:, 1, 1] = (c1 * x1 - s1 * y1) * deg_to_rad
+        jac_data[:, 1, 3] = (s2 * y2 - c2 * x2) * deg_to_rad
+        
+        return residuals.ravel(), jac_data
+        
+    def pack_pairwise_matches(self, fragment_ids: List[str],
+                              pairwise_matches: List[dict]) -> Tuple[np.ndarray, ...]:
+        """
+        Flatten pairwise matches into struct-of-arrays form
+        
+        Returns:
+            (pair_indices, pair_offsets, pts1, pts2) where pair_indices holds the
+            two fragment parameter indices per pair and pair p's centroid-relative
+            points are pts1/pts2[pair_offsets[p]:pair_offsets[p + 1]]
+        """
+        fragment_index = {frag_id: i for i, frag_id in enumerate(fragment_ids)}
+        pair_indices = []
+        pair_offsets = [0]
+        pts1_list = []
+        pts2_list = []
+        
+        for match_data in pairwise_matches:
+            i = fragment_index.get(match_data['fragment1_id'])
+            j = fragment_index.get(match_data['fragment2_id'])
+            if i is None or j is None:
+                continue
+                
+            pair_indices.append((i, j))
+            pair_offsets.append(pair_offsets[-1] + len(match_data['pts1']))
+            pts1_list.append(match_data['pts1_centered'])
+            pts2_list.append(match_data['pts2_centered'])
+            
+        if not pair_indices:
+            empty = np.zeros((0, 2), dtype=np.float64)
+            return (np.zeros((0, 2), dtype=np.int64), np.zeros(1, dtype=np.int64), empty, empty)
+            
+        return (np.array(pair_indices, dtype=np.int64),
+                np.array(pair_offsets, dtype=np.int64),
+                np.ascontiguousarray(np.concatenate(pts1_list), dtype=np.float64),
+                np.ascontiguousarray(np.concatenate(pts2_list), dtype=np.float64))
+        
     def transforms_to_params(self, transforms: Dict[str, dict], fragment_ids: List[str]) -> np.ndarray:
         """Convert transform dictionaries to parameter vector"""
-        params = []
-        
-        for frag_id in fragment_ids:
-            if frag_id in transforms:
-                transform = transforms[frag_id]
-                # Parameters: [x, y, rotation] (flip is kept fixed)
-                params.extend([
-                    transform['translation'][0],
-                    transform['translation'][1],
-                    transform['rotation']
-                ])
-            else:
-                # Default parameters
-                params.extend([0.0, 0.0, 0.0])
+        # Parameters: [x, y, rotation] per fragment (flip is kept fixed),
+        # fragments without a transform default to zeros
+        poses = np.zeros((len(fragment_ids), 3))
+        
+        for row, frag_id in enumerate(fragment_ids):
+            transform = transforms.get(frag_id)
+            if transform is not None:
+                poses[row, 0], poses[row, 1] = transform['translation']
+                poses[row, 2] = transform['rotation']
                 
-        return np.array(params)
+        return poses.ravel()
         
     def params_to_transforms(self, params: np.ndarray, fragment_ids: List[str]) -> Dict[str, dict]:
         """Convert parameter vector back to transform dictionaries"""
         transforms = {}
         
-        for i, frag_id in enumerate(fragment_ids):
-            base_idx = i * 3
+        for frag_id, (x, y, rotation) in zip(fragment_ids, params.reshape(-1, 3).tolist()):
             transforms[frag_id] = {
-                'translation': (params[base_idx], params[base_idx + 1]),
-                'rotation': int(params[base_idx + 2]) % 360,
+                'translation': (x, y),
+                'rotation': rotation % 360.0,
                 'flip_horizontal': False  # Keep original flip state
             }
             
         return transforms
         
     def compute_alignment_error(self, params: np.ndarray, fragment_ids: List[str],
-                              pairwise_matches: List[dict]) -> float:
+                              pairwise_matches: List[dict],
+                              fragment_index: Optional[Dict[str, int]] = None) -> float:
         """Compute alignment error for current parameter values"""
         total_error = 0.0
         num_matches = 0
         
-        # Convert params to transforms
-        transforms = self.params_to_transforms(params, fragment_ids)
+        # Parameters are laid out as [x, y, rotation] per fragment
+        poses = params.reshape(-1, 3)
+        if fragment_index is None:
+            fragment_index = {frag_id: i for i, frag_id in enumerate(fragment_ids)}
+            
+        # Rotation matrices computed once per fragment rather than once per pair
+        angles = np.radians(poses[:, 2])
+        cos_a, sin_a = np.cos(angles), np.sin(angles)
+        rotations_t = np.empty((len(poses), 2, 2))
+        rotations_t[:, 0, 0] = cos_a
+        rotations_t[:, 0, 1] = sin_a
+        rotations_t[:, 1, 0] = -sin_a
+        rotations_t[:, 1, 1] = cos_a
         
         for match_data in pairwise_matches:
-            frag1_id = match_data['fragment1_id']
-            frag2_id = match_data['fragment2_id']
+            i = fragment_index.get(match_data['fragment1_id'])
+            j = fragment_index.get(match_data['fragment2_id'])
             
-            if frag1_id not in transforms or frag2_id not in transforms:
+            if i is None or j is None:
                 continue
                 
-            # Get transforms
-            transform1 = transforms[frag1_id]
-            transform2 = transforms[frag2_id]
+            # Transform matched points straight from the parameter rows
+            # (rotation kept continuous so the error is smooth)
+            p1_world = match_data['pts1'] @ rotations_t[i] + poses[i, :2]
+            p2_world = match_data['pts2'] @ rotations_t[j] + poses[j, :2]
             
-            # Compute error for this pair
-            error = self.compute_pairwise_error(match_data, transform1, transform2)
-            total_error += error
+            total_error += float(np.linalg.norm(p1_world - p2_world, axis=1).sum())
             num_matches += len(match_data['matches'])
             
-        return total_error / max(num_matches, 1)
-        
-    def compute_pairwise_error(self, match_data: dict, transform1: dict, transform2: dict) -> float:
-        """Compute alignment error between a pair of fragments"""
-        matches = match_data['matches']
-        features1 = match_data['features1']
-        features2 = match_data['features2']
-        
-        if not matches:
-            return 0.0
-            
-        total_error = 0.0
-        
-        for match in matches:
-            # Get keypoint coordinates
-            kp1 = features1['keypoints'][match.queryIdx]
-            kp2 = features2['keypoints'][match.trainIdx]
-            
-            # Transform points to world coordinates
-            pt1_world = self.transform_point(kp1.pt, transform1)
-            pt2_world = self.transform_point(kp2.pt, transform2)
-            
-            # Compute distance error
-            dx = pt1_world[0] - pt2_world[0]
-            dy = pt1_world[1] - pt2_world[1]
-            error = np.sqrt(dx*dx + dy*dy)
-            
-            total_error += error
-            
-        return total_error
-        
-    def transform_point(self, point: Tuple[float, float], transform: dict) -> Tuple[float, float]:
-        """Transform a point using the given transform parameters"""
-        x, y = point
-        
-        # Apply rotation
-        angle_rad = np.radians(transform['rotation'])
-        cos_a = np.cos(angle_rad)
-        sin_a = np.sin(angle_rad)
-        
-        x_rot = x * cos_a - y * sin_a
-        y_rot = x * sin_a + y * cos_a
-        
-        # Apply translation
-        x_final = x_rot + transform['translation'][0]
-        y_final = y_rot + transform['translation'][1]
-        
-        return (x_final, y_final)
\ No newline at end of file
+        return total_error / max(num_matches, 1)
\ No newline at end of file
@@ -3,8 +3,8 @@ Fragment data structure and management
 """
 
 import numpy as np
-from typing import Optional, Tuple
-from dataclasses import dataclass, field
+from typing import Optional, Set, Tuple
+from dataclasses import dataclass, field, replace
 import uuid
 import cv2
 
@@ -14,10 +14,13 @@ class Fragment:
     
     id: str = field(default_factory=lambda: str(uuid.uuid4()))
     name: str = ""
-    image_data: Optional[np.ndarray] = None
+    image_data: Optional[np.ndarray] = None  # Untransformed pixels, see get_transformed_image()
     original_image_data: Optional[np.ndarray] = None
     transformed_image_cache: Optional[np.ndarray] = None
     cache_valid: bool = False
+    gray_cache: Optional[np.ndarray] = None
+    cache_gray_valid: bool = False
+    bbox_size_cache: Optional[Tuple[int, int]] = None  # Transformed (width, height)
     
     # Position and transformation
     x: float = 0.0
@@ -28,9 +31,11 @@ class Fragment:
     
     # Display properties
     visible: bool = True
-    selected: bool = False
     opacity: float = 1.0
     
+    # Selection set owned by the FragmentManager (see attach_selection)
+    _selection: Optional[Set[str]] = field(default=None, repr=False, compare=False)
+    
     # Metadata
     file_path: str = ""
     original_size: Tuple[int, int] = (0, 0)
@@ -39,12 +44,36 @@ class Fragment:
     def __post_init__(self):
         """Post-initialization processing"""
         if self.image_data is not None and self.original_image_data is None:
-            self.original_image_data = self.image_data.copy()
+            # Transforms never modify pixels in place, so share the buffer
+            self.original_image_data = self.image_data
             self.original_size = (self.image_data.shape[1], self.image_data.shape[0])
             self.cache_valid = False
     
+    @property
+    def selected(self) -> bool:
+        """Whether this fragment is in its manager's current selection"""
+        return self._selection is not None and self.id in self._selection
+        
+    def attach_selection(self, selection: Set[str]):
+        """Share the manager's selected-id set as the source of truth for `selected`"""
+        self._selection = selection
+        
+    def snapshot(self) -> 'Fragment':
+        """Detached copy for reading on another thread
+        
+        Pixel buffers and any valid caches are shared (they are never written in
+        place); the copy fills its own caches, so edits to this fragment and
+        invalidate_cache() cannot race with it. The selection is not carried
+        over.
+        """
+        return replace(self, _selection=None)
+        
     def get_transformed_image(self) -> np.ndarray:
-        """Get the image with current transformations applied"""
+        """Get the image with current transformations applied
+        
+        image_data and original_image_data always hold the untransformed
+        pixels; the result here is cached until invalidate_cache().
+        """
         if self.original_image_data is None:
             return None
             
@@ -52,13 +81,20 @@ class Fragment:
         if self.cache_valid and self.transformed_image_cache is not None:
             return self.transformed_image_cache
             
-        img = self.original_image_data.copy()
+        # Identity transform - share the original pixels, no copy needed
+        if (not self.flip_horizontal and not self.flip_vertical and
+                abs(self.rotation) <= 0.01):
+            self.transformed_image_cache = self.original_image_data
+            self.cache_valid = True
+            return self.original_image_data
+            
+        img = self.original_image_data
         
-        # Apply horizontal flip
+        # Apply horizontal flip (returns a view, original is untouched)
         if self.flip_horizontal:
             img = np.fliplr(img)
             
-        # Apply vertical flip
+        # Apply vertical flip (returns a view, original is untouched)
         if self.flip_vertical:
             img = np.flipud(img)
             
@@ -66,12 +102,10 @@ class Fragment:
         if abs(self.rotation) > 0.01:  # Only rotate if angle is significant
             img = self._rotate_image(img, self.rotation)
             
-        # Cache the result
+        # Cache the result, contiguous so the canvas can wrap it without a copy
+        img = np.ascontiguousarray(img)
         self.transformed_image_cache = img
         self.cache_valid = True
-        
-        # Also update the main image_data for compatibility
-        self.image_data = img
             
         return img
         
@@ -80,21 +114,14 @@ class Fragment:
         if abs(angle) < 0.01:
             return image
             
+        # Cardinal angles are an exact pixel permutation - no interpolation needed.
+        # np.rot90 turns counter-clockwise like cv2.getRotationMatrix2D.
+        cardinal_angle = round(angle) % 360
+        if abs(angle - round(angle)) < 0.01 and cardinal_angle % 90 == 0:
+            return np.rot90(image, k=cardinal_angle // 90)
+            
         height, width = image.shape[:2]
-        center = (width // 2, height // 2)
-        
-        # Get rotation matrix
-        rotation_matrix = cv2.getRotationMatrix2D(center, angle, 1.0)
-        
-        # Calculate new bounding box
-        cos_val = abs(rotation_matrix[0, 0])
-        sin_val = abs(rotation_matrix[0, 1])
-        new_width = int((height * sin_val) + (width * cos_val))
-        new_height = int((height * cos_val) + (width * sin_val))
-        
-        # Adjust rotation matrix for new center
-        rotation_matrix[0, 2] += (new_width / 2) - center[0]
-        rotation_matrix[1, 2] += (new_height / 2) - center[1]
+        rotation_matrix, new_width, new_height = self._rotation_canvas(width, height, angle)
         
         # Apply rotation with proper interpolation and border handling
         if len(image.shape) == 3 and image.shape[2] == 4:
@@ -115,21 +142,83 @@ class Fragment:
             
         return rotated
         
+    def _rotation_canvas(self, width: int, height: int,
+                         angle: float) -> Tuple[np.ndarray, int, int]:
+        """Rotation matrix and expanded output size for a non-cardinal rotation"""
+        center = (width // 2, height // 2)
+        
+        # Get rotation matrix
+        rotation_matrix = cv2.getRotationMatrix2D(center, angle, 1.0)
+        
+        # Calculate new bounding box
+        cos_val = abs(rotation_matrix[0, 0])
+        sin_val = abs(rotation_matrix[0, 1])
+        new_width = int((height * sin_val) + (width * cos_val))
+        new_height = int((height * cos_val) + (width * sin_val))
+        
+        # Adjust rotation matrix for new center
+        rotation_matrix[0, 2] += (new_width / 2) - center[0]
+        rotation_matrix[1, 2] += (new_height / 2) - center[1]
+        
+        return rotation_matrix, new_width, new_height
+        
+    def _transformed_size(self) -> Tuple[int, int]:
+        """Width and height get_transformed_image() produces, without rendering it"""
+        if self.cache_valid and self.transformed_image_cache is not None:
+            height, width = self.transformed_image_cache.shape[:2]
+            return (width, height)
+            
+        # Flips keep the size; rotation follows the same rules as _rotate_image
+        height, width = self.original_image_data.shape[:2]
+        angle = self.rotation
+        if abs(angle) <= 0.01:
+            return (width, height)
+            
+        cardinal_angle = round(angle) % 360
+        if abs(angle - round(angle)) < 0.01 and cardinal_angle % 90 == 0:
+            return (height, width) if cardinal_angle % 180 else (width, height)
+            
+        _, new_width, new_height = self._rotation_canvas(width, height, angle)
+        return (new_width, new_height)
+        
     def invalidate_cache(self):
         """Invalidate the transformed image cache"""
+        self.bbox_size_cache = None
         self.cache_valid = False
         self.transformed_image_cache = None
+        self.cache_gray_valid = False
+        self.gray_cache = None
+        
+    def get_gray_image(self) -> Optional[np.ndarray]:
+        """Get the transformed image as single-channel grayscale (cached)"""
+        if self.cache_gray_valid and self.gray_cache is not None:
+            return self.gray_cache
+            
+        image = self.get_transformed_image()
+        if image is None:
+            return None
+            
+        if len(image.shape) == 3 and image.shape[2] == 4:
+            gray = cv2.cvtColor(image, cv2.COLOR_RGBA2GRAY)
+        elif len(image.shape) == 3:
+            gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        else:
+            gray = image
+            
+        self.gray_cache = gray
+        self.cache_gray_valid = True
+        return gray
     
     def get_bounding_box(self) -> Tuple[float, float, float, float]:
         """Get the bounding box of the transformed fragment (x, y, width, height)"""
-        if self.image_data is None:
-            return (self.x, self.y, 0, 0)
-            
-        transformed_img = self.get_transformed_image()
-        if transformed_img is None:
+        if self.image_data is None or self.original_image_data is None:
             return (self.x, self.y, 0, 0)
             
-        height, width = transformed_img.shape[:2]
+        # The size only depends on rotation/flip, so it is cached until
+        # invalidate_cache(); the position is always read live
+        if self.bbox_size_cache is None:
+            self.bbox_size_cache = self._transformed_size()
+        width, height = self.bbox_size_cache
         
         return (self.x, self.y, width, height)
     
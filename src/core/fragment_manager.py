@@ -2,13 +2,48 @@
 Fragment management system
 """
 
-from typing import Dict, List, Optional, Tuple
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Set, Tuple
 from PyQt6.QtCore import QObject, pyqtSignal
 import numpy as np
 import math
+import logging
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
 
 from .fragment import Fragment
 
+# Exact (cos, sin) for quarter turns, avoiding trig rounding like cos(90°) = 6e-17
+_QUARTER_TURN_TRIG = {0: (1.0, 0.0), 90: (0.0, 1.0), 180: (-1.0, 0.0), 270: (0.0, -1.0)}
+
+def _wrap360(angle: float) -> float:
+    """Normalize an angle to [0, 360), skipping the modulo when already in range"""
+    angle = float(angle)
+    if 0.0 <= angle < 360.0:
+        return angle
+    if not math.isfinite(angle):
+        return 0.0
+    angle %= 360.0
+    # Tiny negative angles wrap to exactly 360.0 in floating point
+    return 0.0 if angle == 360.0 else angle
+
+# Below this many fragments NumPy's dispatch beats the JIT kernel's thread launch
+_JIT_MIN_FRAGMENTS = 256
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _rotate_points(pos, cx, cy, cos_a, sin_a):
+        """Rotate (N, 2) positions about (cx, cy) in place"""
+        for i in prange(pos.shape[0]):
+            rel_x = pos[i, 0] - cx
+            rel_y = pos[i, 1] - cy
+            pos[i, 0] = cx + rel_x * cos_a - rel_y * sin_a
+            pos[i, 1] = cy + rel_x * sin_a + rel_y * cos_a
+
 class FragmentManager(QObject):
     """Manages all tissue fragments and their transformations"""
     
@@ -18,9 +53,70 @@ class FragmentManager(QObject):
     
     def __init__(self):
         super().__init__()
+        self.logger = logging.getLogger(__name__)
         self._fragments: Dict[str, Fragment] = {}
         self._selected_fragment_id: Optional[str] = None
-        self._selected_fragment_ids: List[str] = []  # For group selection
+        # Ids of every selected fragment (single or group); Fragment.selected
+        # reads membership from this set, so it is only ever mutated in place
+        self._selected_ids: Set[str] = set()
+        
+        # Signal batching: while _batch_depth > 0 change notifications are
+        # deferred and emitted once when the outermost batch ends
+        self._batch_depth = 0
+        self._pending_emit = False
+        self._pending_group_selection: Optional[List[str]] = None
+        
+        # Composite bounds of the visible fragments, None when stale
+        self._bounds_cache: Optional[Tuple[float, float, float, float]] = None
+        
+        # Snapshot of all fragments in order, None after membership changes
+        self._all_fragments_cache: Optional[Tuple[Fragment, ...]] = None
+        
+    @contextmanager
+    def batched(self):
+        """Defer fragments_changed/group_selection_changed until the block exits"""
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self._flush_pending_signals()
+                
+    def begin_batch(self):
+        """Start deferring change notifications (pair with end_batch)"""
+        self._batch_depth += 1
+        
+    def end_batch(self):
+        """Stop deferring change notifications, emitting any that are pending"""
+        if self._batch_depth > 0:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self._flush_pending_signals()
+                
+    def _flush_pending_signals(self):
+        """Emit the notifications collected during a batch"""
+        if self._pending_group_selection is not None:
+            selection = self._pending_group_selection
+            self._pending_group_selection = None
+            self.group_selection_changed.emit(selection)
+        if self._pending_emit:
+            self._pending_emit = False
+            self.fragments_changed.emit()
+            
+    def _emit_changed(self):
+        """Emit fragments_changed, or defer it while a batch is open"""
+        if self._batch_depth:
+            self._pending_emit = True
+        else:
+            self.fragments_changed.emit()
+            
+    def _emit_group_selection_changed(self, fragment_ids: List[str]):
+        """Emit group_selection_changed, or defer it while a batch is open"""
+        if self._batch_depth:
+            self._pending_group_selection = list(fragment_ids)
+        else:
+            self.group_selection_changed.emit(fragment_ids)
         
     def add_fragment_from_image(self, image_data: np.ndarray, name: str, 
                                file_path: str = "") -> str:
@@ -30,31 +126,45 @@ class FragmentManager(QObject):
             image_data=image_data,
             file_path=file_path
         )
+        fragment.attach_selection(self._selected_ids)
         
         self._fragments[fragment.id] = fragment
+        self._all_fragments_cache = None
         
         # Auto-select first fragment
         if len(self._fragments) == 1:
             self.set_selected_fragment(fragment.id)
             
-        self.fragments_changed.emit()
+        self._bounds_cache = None
+        self._emit_changed()
         return fragment.id
     
     def get_fragment(self, fragment_id: str) -> Optional[Fragment]:
         """Get fragment by ID"""
         return self._fragments.get(fragment_id)
     
-    def get_all_fragments(self) -> List[Fragment]:
-        """Get all fragments"""
-        return list(self._fragments.values())
+    def get_fragments_bulk(self, fragment_ids: List[str]) -> List[Fragment]:
+        """Get the fragments for several IDs in order, skipping unknown ones"""
+        lookup = self._fragments.get
+        return [fragment for fragment in map(lookup, fragment_ids) if fragment is not None]
+    
+    def get_all_fragments(self) -> Tuple[Fragment, ...]:
+        """Get all fragments (a shared snapshot, rebuilt when fragments are added or removed)"""
+        if self._all_fragments_cache is None:
+            self._all_fragments_cache = tuple(self._fragments.values())
+        return self._all_fragments_cache
     
     def get_selected_fragments(self) -> List[Fragment]:
         """Get all selected fragments (for group operations)"""
-        return [self._fragments[fid] for fid in self._selected_fragment_ids if fid in self._fragments]
+        return [self._fragments[fid] for fid in self._selected_ids if fid in self._fragments]
     
     def has_group_selection(self) -> bool:
         """Check if multiple fragments are selected"""
-        return len(self._selected_fragment_ids) > 1
+        return len(self._selected_ids) > 1
+    
+    def is_selected(self, fragment_id: str) -> bool:
+        """Check if a fragment is part of the current selection"""
+        return fragment_id in self._selected_ids
     
     def get_visible_fragments(self) -> List[Fragment]:
         """Get only visible fragments"""
@@ -64,88 +174,65 @@ class FragmentManager(QObject):
         """Remove a fragment"""
         if fragment_id in self._fragments:
             del self._fragments[fragment_id]
+            self._all_fragments_cache = None
+            self._selected_ids.discard(fragment_id)
             
             # Update selection if removed fragment was selected
             if self._selected_fragment_id == fragment_id:
-                remaining_ids = list(self._fragments.keys())
-                self._selected_fragment_id = remaining_ids[0] if remaining_ids else None
+                self._selected_fragment_id = next(iter(self._fragments), None)
+                if self._selected_fragment_id:
+                    self._selected_ids.add(self._selected_fragment_id)
                 
-            self.fragments_changed.emit()
+            self._bounds_cache = None
+            self._emit_changed()
             return True
         return False
     
     def set_group_selection(self, fragment_ids: List[str]):
         """Set multiple fragments as selected (group selection)"""
-        # Clear previous selections
-        for fid in self._selected_fragment_ids:
-            fragment = self._fragments.get(fid)
-            if fragment:
-                fragment.selected = False
+        new_ids = set(fragment_ids) & self._fragments.keys()
         
-        # Clear single selection
-        if self._selected_fragment_id:
-            prev_fragment = self._fragments.get(self._selected_fragment_id)
-            if prev_fragment:
-                prev_fragment.selected = False
-        
-        # Set new group selection
-        self._selected_fragment_ids = [fid for fid in fragment_ids if fid in self._fragments]
+        # Apply only the symmetric difference, in place since the set is
+        # shared with the fragments (also drops any single selection)
+        self._selected_ids.difference_update(self._selected_ids - new_ids)
+        self._selected_ids.update(new_ids)
         self._selected_fragment_id = None  # Clear single selection when group is selected
         
-        # Mark fragments as selected
-        for fid in self._selected_fragment_ids:
-            fragment = self._fragments.get(fid)
-            if fragment:
-                fragment.selected = True
+        # Keep the caller's order for listeners, dropping duplicates
+        group_ids = [fid for fid in dict.fromkeys(fragment_ids) if fid in new_ids]
         
-        self.group_selection_changed.emit(self._selected_fragment_ids)
-        self.fragments_changed.emit()
+        self._emit_group_selection_changed(group_ids)
+        self._emit_changed()
     
     def clear_selection(self):
         """Clear all selections"""
-        # Clear group selection
-        for fid in self._selected_fragment_ids:
-            fragment = self._fragments.get(fid)
-            if fragment:
-                fragment.selected = False
-        
-        # Clear single selection
-        if self._selected_fragment_id:
-            fragment = self._fragments.get(self._selected_fragment_id)
-            if fragment:
-                fragment.selected = False
-        
-        self._selected_fragment_ids = []
+        self._selected_ids.clear()
         self._selected_fragment_id = None
         
-        self.group_selection_changed.emit([])
-        self.fragments_changed.emit()
+        self._emit_group_selection_changed([])
+        self._emit_changed()
     
     def set_selected_fragment(self, fragment_id: Optional[str]):
         """Set the selected fragment"""
-        # Clear group selection when selecting single fragment
-        for fid in self._selected_fragment_ids:
-            fragment = self._fragments.get(fid)
-            if fragment:
-                fragment.selected = False
-        self._selected_fragment_ids = []
-        
-        # Deselect previous fragment
-        if self._selected_fragment_id:
-            prev_fragment = self._fragments.get(self._selected_fragment_id)
-            if prev_fragment:
-                prev_fragment.selected = False
-                
+        # A group is active when ids are selected without a single selection
+        had_group = bool(self._selected_ids) and self._selected_fragment_id is None
+        if fragment_id == self._selected_fragment_id and not had_group:
+            return
+            
+        # Selecting a single fragment replaces any group selection
+        self._selected_ids.clear()
         self._selected_fragment_id = fragment_id
         
         # Select new fragment
         if fragment_id and fragment_id in self._fragments:
-            self._fragments[fragment_id].selected = True
+            self._selected_ids.add(fragment_id)
             self.fragment_selected.emit(fragment_id)
         
-        self.group_selection_changed.emit(self._selected_fragment_ids)
+        # Listeners only need to hear about the group when one was dropped
+        if had_group:
+            self._emit_group_selection_changed([])
             
-        self.fragments_changed.emit()
+        self._emit_changed()
     
     def get_selected_fragment_id(self) -> Optional[str]:
         """Get the selected fragment ID"""
@@ -153,8 +240,8 @@ class FragmentManager(QObject):
     
     def get_selected_fragment_ids(self) -> List[str]:
         """Get all selected fragment IDs (including group selection)"""
-        if self._selected_fragment_ids:
-            return self._selected_fragment_ids.copy()
+        if self._selected_ids:
+            return list(self._selected_ids)
         return [self._selected_fragment_id] if self._selected_fragment_id else []
     
     def get_selected_fragment(self) -> Optional[Fragment]:
@@ -166,100 +253,163 @@ class FragmentManager(QObject):
     def set_fragment_visibility(self, fragment_id: str, visible: bool):
         """Set fragment visibility"""
         fragment = self._fragments.get(fragment_id)
-        if fragment:
+        if fragment and fragment.visible != visible:
             fragment.visible = visible
-            self.fragments_changed.emit()
+            self._bounds_cache = None
+            self._emit_changed()
     
     def set_fragment_position(self, fragment_id: str, x: float, y: float):
         """Set fragment position"""
         fragment = self._fragments.get(fragment_id)
         if fragment:
             # Store positions as floats without excessive rounding
-            fragment.x = float(x)
-            fragment.y = float(y)
+            x, y = float(x), float(y)
+            if fragment.x == x and fragment.y == y:
+                return
+            fragment.x = x
+            fragment.y = y
             
-            self.fragments_changed.emit()
+            self._bounds_cache = None
+            self._emit_changed()
     
     def translate_fragment(self, fragment_id: str, dx: float, dy: float):
         """Translate fragment by offset"""
         fragment = self._fragments.get(fragment_id)
-        if fragment:
+        if fragment and (dx or dy):
             fragment.x = fragment.x + float(dx)
             fragment.y = fragment.y + float(dy)
             
-            self.fragments_changed.emit()
+            self._bounds_cache = None
+            self._emit_changed()
     
     def translate_group(self, fragment_ids: List[str], dx: float, dy: float):
         """Translate multiple fragments by the same offset (preserving relative positions)"""
-        for fragment_id in fragment_ids:
-            fragment = self._fragments.get(fragment_id)
-            if fragment:
-                fragment.x = fragment.x + float(dx)
-                fragment.y = fragment.y + float(dy)
+        if not dx and not dy:
+            return
+        fragments = [self._fragments[fid] for fid in fragment_ids if fid in self._fragments]
+        if fragments:
+            positions = self._gather_positions(fragments)
+            positions += (float(dx), float(dy))
+            self._scatter_positions(fragments, positions)
+            
+            # Moving every visible fragment just shifts the composite bounds
+            if self._bounds_cache is not None and self._moves_all_visible(fragments):
+                min_x, min_y, max_x, max_y = self._bounds_cache
+                self._bounds_cache = (min_x + dx, min_y + dy, max_x + dx, max_y + dy)
+            else:
+                self._bounds_cache = None
         
-        self.fragments_changed.emit()
+        self._emit_changed()
+    
+    def _moves_all_visible(self, fragments: List[Fragment]) -> bool:
+        """Check whether a fragment list covers every visible fragment"""
+        moved_ids = {fragment.id for fragment in fragments}
+        return all(f.id in moved_ids for f in self._fragments.values() if f.visible)
     
     def rotate_fragment(self, fragment_id: str, angle: int):
         """Rotate fragment by angle (90 degree increments)"""
         fragment = self._fragments.get(fragment_id)
         if fragment:
-            fragment.rotation = (fragment.rotation + angle) % 360.0
+            new_rotation = _wrap360(fragment.rotation + angle)
+            if new_rotation == fragment.rotation:
+                return
+            fragment.rotation = new_rotation
             fragment.invalidate_cache()
-            self.fragments_changed.emit()
+            self._bounds_cache = None
+            self._emit_changed()
     
     def set_fragment_rotation(self, fragment_id: str, angle: float):
         """Set fragment rotation to specific angle"""
         fragment = self._fragments.get(fragment_id)
         if fragment:
-            fragment.rotation = angle % 360.0
+            new_rotation = _wrap360(angle)
+            if new_rotation == fragment.rotation:
+                return
+            fragment.rotation = new_rotation
             fragment.invalidate_cache()
-            self.fragments_changed.emit()
+            self._bounds_cache = None
+            self._emit_changed()
     
     def rotate_group(self, fragment_ids: List[str], angle: int):
         """Rotate multiple fragments around their group center"""
-        print(f"rotate_group called with {len(fragment_ids)} fragments, angle: {angle}")
+        self.logger.debug("rotate_group called with %d fragments, angle: %s", len(fragment_ids), angle)
         if not fragment_ids:
             return
         
         # Get fragments
         fragments = [self._fragments[fid] for fid in fragment_ids if fid in self._fragments]
         if not fragments:
-            print("No valid fragments found!")
+            self.logger.debug("No valid fragments found!")
             return
         
-        print(f"Found {len(fragments)} valid fragments to rotate")
+        self.logger.debug("Found %d valid fragments to rotate", len(fragments))
         
         # Calculate group center (centroid) using fragment positions, not bounding boxes
-        center_x = sum(f.x for f in fragments) / len(fragments)
-        center_y = sum(f.y for f in fragments) / len(fragments)
-        print(f"Group center: ({center_x}, {center_y})")
+        positions = self._gather_positions(fragments)
+        center = positions.mean(axis=0)
+        self.logger.debug("Group center: (%s, %s)", center[0], center[1])
         
-        # Convert angle to radians
-        angle_rad = math.radians(angle)
-        cos_a = math.cos(angle_rad)
-        sin_a = math.sin(angle_rad)
+        # Quarter turns (the common UI case) use exact values, others go through trig
+        trig = _QUARTER_TURN_TRIG.get(angle % 360)
+        if trig is not None:
+            cos_a, sin_a = trig
+        else:
+            angle_rad = math.radians(angle)
+            cos_a = math.cos(angle_rad)
+            sin_a = math.sin(angle_rad)
         
-        # Rotate each fragment around the group center
-        for fragment in fragments:
-            # Translate fragment position to origin (relative to group center)
-            rel_x = fragment.x - center_x
-            rel_y = fragment.y - center_y
-            
-            # Rotate around origin
-            new_rel_x = rel_x * cos_a - rel_y * sin_a
-            new_rel_y = rel_x * sin_a + rel_y * cos_a
-            
-            # Translate back to world coordinates
-            fragment.x = center_x + new_rel_x
-            fragment.y = center_y + new_rel_y
-            
-            # Also rotate the fragment itself
-            fragment.rotation = (fragment.rotation + angle) % 360.0
+        # Rotate all positions around the group center in one step
+        if NUMBA_AVAILABLE and len(fragments) >= _JIT_MIN_FRAGMENTS:
+            _rotate_points(positions, center[0], center[1], cos_a, sin_a)
+        else:
+            rotation = np.array([[cos_a, -sin_a],
+                                 [sin_a, cos_a]])
+            positions = (positions - center) @ rotation.T + center
+        self._scatter_positions(fragments, positions)
+        
+        # Also rotate the fragments themselves: read all rotations in one pass,
+        # then write them back
+        new_rotations = [_wrap360(fragment.rotation + angle) for fragment in fragments]
+        for fragment, rotation in zip(fragments, new_rotations):
+            fragment.rotation = rotation
             fragment.invalidate_cache()
-            print(f"Rotated fragment {fragment.name}: new pos=({fragment.x:.1f}, {fragment.y:.1f}), new rotation={fragment.rotation}")
+            
+        if self.logger.isEnabledFor(logging.DEBUG):
+            for fragment in fragments:
+                self.logger.debug("Rotated fragment %s: new pos=(%.1f, %.1f), new rotation=%s",
+                                  fragment.name, fragment.x, fragment.y, fragment.rotation)
+        
+        self.logger.debug("Group rotation completed, emitting fragments_changed")
+        self._bounds_cache = None
+        self._emit_changed()
+    
+    def apply_bulk_transforms(self, fragment_ids: List[str], translations, rotations):
+        """Offset and rotate many fragments at once, emitting fragments_changed once
+        
+        translations: (N, 2) offsets; rotations: N angles in degrees, each added
+        to the fragment's rotation unless it is within 0.01 of zero
+        """
+        translations = np.asarray(translations, dtype=np.float64).reshape(-1, 2)
+        rotations = np.asarray(rotations, dtype=np.float64).reshape(-1)
+        rows = [row for row, fid in enumerate(fragment_ids) if fid in self._fragments]
+        if not rows:
+            return
+        fragments = [self._fragments[fragment_ids[row]] for row in rows]
         
-        print("Group rotation completed, emitting fragments_changed")
-        self.fragments_changed.emit()
+        positions = self._gather_positions(fragments)
+        positions += translations[rows]
+        self._scatter_positions(fragments, positions)
+        
+        rotations = rotations[rows]
+        for row in np.flatnonzero(np.abs(rotations) > 0.01).tolist():
+            fragment = fragments[row]
+            new_rotation = _wrap360(fragment.rotation + rotations[row])
+            if new_rotation != fragment.rotation:
+                fragment.rotation = new_rotation
+                fragment.invalidate_cache()
+        
+        self._bounds_cache = None
+        self._emit_changed()
     
     def flip_fragment(self, fragment_id: str, horizontal: bool = True):
         """Flip fragment horizontally or vertically"""
@@ -270,7 +420,8 @@ class FragmentManager(QObject):
             else:
                 fragment.flip_vertical = not fragment.flip_vertical
             fragment.invalidate_cache()
-            self.fragments_changed.emit()
+            self._bounds_cache = None
+            self._emit_changed()
     
     def set_fragment_transform(self, fragment_id: str, rotation: int = None,
                               translation: Tuple[float, float] = None,
@@ -280,38 +431,60 @@ class FragmentManager(QObject):
         fragment = self._fragments.get(fragment_id)
         if fragment:
             transform_changed = False
+            position_changed = False
             if rotation is not None:
-                fragment.rotation = float(rotation) % 360.0
-                transform_changed = True
+                new_rotation = _wrap360(rotation)
+                if new_rotation != fragment.rotation:
+                    fragment.rotation = new_rotation
+                    transform_changed = True
             if translation is not None:
-                fragment.x = float(translation[0])
-                fragment.y = float(translation[1])
-            if flip_horizontal is not None:
+                x, y = float(translation[0]), float(translation[1])
+                if fragment.x != x or fragment.y != y:
+                    fragment.x = x
+                    fragment.y = y
+                    position_changed = True
+            if flip_horizontal is not None and flip_horizontal != fragment.flip_horizontal:
                 fragment.flip_horizontal = flip_horizontal
                 transform_changed = True
-            if flip_vertical is not None:
+            if flip_vertical is not None and flip_vertical != fragment.flip_vertical:
                 fragment.flip_vertical = flip_vertical
                 transform_changed = True
             # Only invalidate cache when transforms that affect the image are changed
             if transform_changed:
                 fragment.invalidate_cache()
-            self.fragments_changed.emit()
+            if transform_changed or position_changed:
+                self._bounds_cache = None
+                self._emit_changed()
     
     def reset_fragment_transform(self, fragment_id: str):
         """Reset fragment transformation to default"""
         fragment = self._fragments.get(fragment_id)
         if fragment:
             fragment.reset_transform()
-            self.fragments_changed.emit()
+            self._bounds_cache = None
+            self._emit_changed()
     
     def reset_all_transforms(self):
         """Reset all fragment transformations"""
-        for fragment in self._fragments.values():
+        # Fragments already at the identity keep their cached images
+        changed = [f for f in self._fragments.values()
+                   if f.rotation != 0.0 or f.flip_horizontal or f.flip_vertical]
+        if not changed:
+            return
+            
+        for fragment in changed:
             fragment.reset_transform()
-        self.fragments_changed.emit()
+        self._bounds_cache = None
+        self._emit_changed()
     
     def get_composite_bounds(self) -> Tuple[float, float, float, float]:
         """Get bounding box of all visible fragments (min_x, min_y, max_x, max_y)"""
+        if self._bounds_cache is None:
+            self._bounds_cache = self._compute_composite_bounds()
+        return self._bounds_cache
+    
+    def _compute_composite_bounds(self) -> Tuple[float, float, float, float]:
+        """Scan the visible fragments for their combined bounding box"""
         if not self._fragments:
             return (0, 0, 0, 0)
             
@@ -319,17 +492,24 @@ class FragmentManager(QObject):
         if not visible_fragments:
             return (0, 0, 0, 0)
             
-        min_x = min_y = float('inf')
-        max_x = max_y = float('-inf')
-        
-        for fragment in visible_fragments:
-            bbox_x, bbox_y, bbox_w, bbox_h = fragment.get_bounding_box()
-            min_x = min(min_x, bbox_x)
-            min_y = min(min_y, bbox_y)
-            max_x = max(max_x, bbox_x + bbox_w)
-            max_y = max(max_y, bbox_y + bbox_h)
+        # (N, 4) array of (x, y, width, height), reduced in one pass per axis
+        boxes = np.array([fragment.get_bounding_box() for fragment in visible_fragments],
+                         dtype=np.float64)
+        min_x, min_y = boxes[:, :2].min(axis=0)
+        max_x, max_y = (boxes[:, :2] + boxes[:, 2:]).max(axis=0)
             
-        return (min_x, min_y, max_x, max_y)
+        return (float(min_x), float(min_y), float(max_x), float(max_y))
+    
+    def _gather_positions(self, fragments: List[Fragment]) -> np.ndarray:
+        """Collect fragment positions into an (N, 2) float64 array"""
+        return np.array([(fragment.x, fragment.y) for fragment in fragments],
+                        dtype=np.float64).reshape(-1, 2)
+    
+    def _scatter_positions(self, fragments: List[Fragment], positions: np.ndarray):
+        """Write an (N, 2) position array back to the fragments"""
+        for fragment, (x, y) in zip(fragments, positions.tolist()):
+            fragment.x = x
+            fragment.y = y
     
     def export_metadata(self) -> dict:
         """Export fragment metadata for serialization"""
@@ -341,14 +521,22 @@ class FragmentManager(QObject):
     
     def import_metadata(self, metadata: dict):
         """Import fragment metadata"""
-        self._fragments.clear()
+        self._selected_ids.clear()
+        self._selected_fragment_id = None
         
-        for fragment_data in metadata.get('fragments', []):
-            fragment = Fragment.from_dict(fragment_data)
-            self._fragments[fragment.id] = fragment
-            
-        selected_id = metadata.get('selected_fragment_id')
-        if selected_id and selected_id in self._fragments:
-            self.set_selected_fragment(selected_id)
+        # Build all fragments first, then the dict in one go at its final size
+        fragments = [Fragment.from_dict(fragment_data)
+                     for fragment_data in metadata.get('fragments', [])]
+        for fragment in fragments:
+            fragment.attach_selection(self._selected_ids)
+        self._fragments = {fragment.id: fragment for fragment in fragments}
+        self._all_fragments_cache = None
+        self._bounds_cache = None
             
-        self.fragments_changed.emit()
\ No newline at end of file
+        # Restoring the selection shares the single fragments_changed below
+        with self.batched():
+            selected_id = metadata.get('selected_fragment_id')
+            if selected_id and selected_id in self._fragments:
+                self.set_selected_fragment(selected_id)
+                
+            self._emit_changed()
\ No newline at end of file
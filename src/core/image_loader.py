@@ -3,8 +3,12 @@ Image loading utilities for various formats including pyramidal images
 """
 
 import os
+import sys
+import ctypes
+import functools
+import logging
 import numpy as np
-from typing import Optional, Tuple
+from typing import Dict, Optional, Tuple
 import cv2
 from PIL import Image
 import tifffile
@@ -15,13 +19,131 @@ try:
 except ImportError:
     OPENSLIDE_AVAILABLE = False
 
+# OpenSlide's C reader fills premultiplied ARGB words, which are BGRA bytes on
+# little-endian hosts; only then can its output land directly in a NumPy buffer
+NATIVE_READ_AVAILABLE = (OPENSLIDE_AVAILABLE and sys.byteorder == 'little' and
+                         hasattr(getattr(openslide, 'lowlevel', None), '_read_region'))
+
+@functools.lru_cache(maxsize=1024)
+def _file_extension(file_path: str) -> str:
+    """Lower-cased extension of a path, memoized for repeated queries"""
+    return os.path.splitext(file_path)[1].lower()
+
+class PyramidalImageHandle:
+    """
+    Open whole-slide image that reads levels in tiles
+    
+    Used as a context manager by the load paths, so the slide is closed as
+    soon as the level has been read.
+    """
+    
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._slide = openslide.OpenSlide(file_path)
+        self.level_count = self._slide.level_count
+        self.dims = tuple(self._slide.level_dimensions)
+        self.level_downsamples = tuple(self._slide.level_downsamples)
+        
+    def _read_tile(self, level: int, x: int, y: int, w: int, h: int) -> np.ndarray:
+        """Read a (h, w, 4) RGBA region whose origin (x, y) is in level coordinates"""
+        tile = np.empty((h, w, 4), dtype=np.uint8)
+        if not self._read_into(tile, level, x, y):
+            downsample = self.level_downsamples[level]
+            # read_region(location, level, size) - location is in level 0 coordinates
+            region = self._slide.read_region((int(x * downsample), int(y * downsample)), level, (w, h))
+            if region.mode != 'RGBA':
+                region = region.convert('RGBA')
+            tile = np.array(region)
+            region.close()
+        return tile
+        
+    def _read_into(self, out: np.ndarray, level: int, x: int, y: int) -> bool:
+        """Fill a C-contiguous (h, w, 4) uint8 array straight from OpenSlide
+        
+        Skips the PIL image and its conversion copies; returns False when the
+        native reader is unavailable so callers can use read_region instead.
+        """
+        if not NATIVE_READ_AVAILABLE:
+            return False
+            
+        h, w = out.shape[:2]
+        downsample = self.level_downsamples[level]
+        try:
+            openslide.lowlevel._read_region(
+                self._slide._osr, out.ctypes.data_as(ctypes.POINTER(ctypes.c_uint32)),
+                int(x * downsample), int(y * downsample), level, w, h
+            )
+        except (AttributeError, TypeError, ctypes.ArgumentError, openslide.OpenSlideError):
+            return False
+            
+        # Premultiplied BGRA -> straight RGBA, both in place
+        cv2.cvtColor(out, cv2.COLOR_BGRA2RGBA, dst=out)
+        cv2.cvtColor(out, cv2.COLOR_mRGBA2RGBA, dst=out)
+        return True
+        
+    def read_level(self, level: int, tile_size: int = 4096) -> np.ndarray:
+        """Read a whole level into one RGBA array, one tile at a time
+        
+        The destination is allocated once and each tile is copied straight into
+        its slice, so the full level never exists as a PIL image as well.
+        """
+        level = min(max(level, 0), self.level_count - 1)
+        width, height = self.dims[level]
+        image_array = np.empty((height, width, 4), dtype=np.uint8)
+        
+        # Full-width strips are contiguous, so the native reader can write them
+        # in place; the strip height keeps each read near tile_size^2 pixels
+        strip_rows = max(1, (tile_size * tile_size) // max(width, 1))
+        if height and self._read_into(image_array[:min(strip_rows, height)], level, 0, 0):
+            for ty in range(strip_rows, height, strip_rows):
+                if not self._read_into(image_array[ty:ty + strip_rows], level, 0, ty):
+                    break
+            else:
+                return image_array
+        
+        for ty in range(0, height, tile_size):
+            th = min(tile_size, height - ty)
+            for tx in range(0, width, tile_size):
+                tw = min(tile_size, width - tx)
+                image_array[ty:ty + th, tx:tx + tw] = self._read_tile(level, tx, ty, tw, th)
+                
+        return image_array
+        
+    def close(self):
+        """Release the underlying slide"""
+        self._slide.close()
+        
+    def __enter__(self) -> 'PyramidalImageHandle':
+        return self
+        
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
 class ImageLoader:
     """Handles loading of various image formats including pyramidal images"""
     
     def __init__(self):
+        self.logger = logging.getLogger(__name__)
         self.supported_formats = {'.tiff', '.tif', '.png', '.jpg', '.jpeg'}
         if OPENSLIDE_AVAILABLE:
             self.supported_formats.update({'.svs', '.ndpi', '.vms', '.vmu'})
+        
+        # Whole-slide levels are read in square tiles of this size (pixels)
+        self.read_tile_size = 4096
+        
+        # File metadata memoized per (path, mtime, size), so edits invalidate it
+        self._info_cache: Dict[tuple, dict] = {}
+        self._pyr_cache: Dict[tuple, bool] = {}
+    
+    def _file_cache_key(self, file_path: str) -> tuple:
+        """Key identifying a specific version of a file on disk"""
+        st = os.stat(file_path)
+        return (os.path.abspath(file_path), st.st_mtime_ns, st.st_size)
+    
+    def clear_cache(self):
+        """Drop all memoized image info and pyramid checks"""
+        self._info_cache.clear()
+        self._pyr_cache.clear()
     
     def load_image(self, file_path: str, level: int = 0) -> Optional[np.ndarray]:
         """
@@ -34,10 +156,13 @@ class ImageLoader:
         Returns:
             Image data as numpy array or None if loading failed
         """
-        if not os.path.exists(file_path):
+        # os.stat already raises for missing files, no separate exists() check
+        try:
+            os.stat(file_path)
+        except FileNotFoundError:
             raise FileNotFoundError(f"Image file not found: {file_path}")
             
-        file_ext = os.path.splitext(file_path)[1].lower()
+        file_ext = _file_extension(file_path)
         
         if file_ext not in self.supported_formats:
             raise ValueError(f"Unsupported file format: {file_ext}")
@@ -55,93 +180,114 @@ class ImageLoader:
     
     def _load_openslide_image(self, file_path: str, level: int = 8) -> np.ndarray:
         """Load image using OpenSlide for pyramidal formats"""
-        slide = openslide.OpenSlide(file_path)
-        
-        # Get image at specified level
-        if level >= slide.level_count:
-            level = slide.level_count - 1
-            
-        # Read the entire level
-        image = slide.read_region((0, 0), level, slide.level_dimensions[level])
-        
-        # Keep RGBA format to preserve alpha channel
-        if image.mode != 'RGBA':
-            image = image.convert('RGBA')
-        
-        # Convert to numpy array
-        image_array = np.array(image)
-        
-        slide.close()
-        return image_array
+        with PyramidalImageHandle(file_path) as handle:
+            # Read the entire level tile by tile (RGBA preserves the alpha channel),
+            # clamped to the coarsest level available
+            return handle.read_level(level, self.read_tile_size)
     
-
-
     def _load_tiff_image(self, file_path: str, level: int = 7) -> np.ndarray:
         """Load TIFF image using OpenSlide, handling both standard and pyramidal TIFFs"""
         try:
             if OPENSLIDE_AVAILABLE:
                 # Try OpenSlide first (designed for whole slide images)
                 try:
-                    slide = openslide.OpenSlide(file_path)
+                    handle = PyramidalImageHandle(file_path)
                 except openslide.OpenSlideError:
                     # OpenSlide can't handle this file, fall back to PIL/tifffile
                     raise ImportError("OpenSlide cannot handle this file")
                 
                 # Check if the requested level exists
-                max_level = slide.level_count - 1
-                if level > max_level:
-                    level = max_level
-                
-                # Get the dimensions of the slide at the specified level
-                level_dimensions = slide.level_dimensions[level]
+                level = min(level, handle.level_count - 1)
                 
-                # Read the entire slide at the specified level
-                # read_region(location, level, size) - location is (x, y) in level 0 coordinates
-                # For the entire slide, we start at (0, 0) and read the full dimensions
-                image = slide.read_region((0, 0), level, level_dimensions)
+                # Read the entire slide at the specified level, tile by tile
+                with handle:
+                    image_array = handle.read_level(level, self.read_tile_size)
                 
-                # Convert PIL Image to numpy array
-                image_array = np.array(image)
-                
-                slide.close()
-                
-                print(f"Loaded TIFF with OpenSlide at level {level}: {image_array.shape}")
+                self.logger.debug("Loaded TIFF with OpenSlide at level %d: %s", level, image_array.shape)
             else:
                 raise ImportError("OpenSlide not available")
             
         except Exception as e:
-            print(f"OpenSlide failed for {file_path}: {e}")
+            self.logger.debug("OpenSlide failed for %s: %s", file_path, e)
             
-            # Fallback to PIL
-            try:
-                print(f"Falling back to PIL for {file_path}")
-                image = Image.open(file_path)
-                # Preserve alpha channel if present
-                if image.mode in ['RGBA', 'LA']:
-                    pass  # Keep as is
-                elif image.mode in ['RGB', 'L']:
-                    # Add alpha channel
-                    image = image.convert('RGBA')
-                image_array = np.array(image)
-                print(f"Loaded TIFF with PIL: {image_array.shape}")
-            except Exception as pil_error:
-                print(f"PIL also failed: {pil_error}")
-                raise
+            # Uncompressed TIFFs are mapped rather than decoded
+            image_array = self._memmap_tiff(file_path)
+            if image_array is not None:
+                self.logger.debug("Memory-mapped TIFF: %s", image_array.shape)
+            else:
+                # Fallback to PIL
+                try:
+                    self.logger.debug("Falling back to PIL for %s", file_path)
+                    image = Image.open(file_path)
+                    # Preserve alpha channel if present
+                    if image.mode in ['RGBA', 'LA']:
+                        pass  # Keep as is
+                    elif image.mode in ['RGB', 'L']:
+                        # Add alpha channel
+                        image = image.convert('RGBA')
+                    image_array = np.array(image)
+                    self.logger.debug("Loaded TIFF with PIL: %s", image_array.shape)
+                except Exception as pil_error:
+                    self.logger.warning("PIL also failed: %s", pil_error)
+                    raise
         
         # Ensure RGBA format
         if len(image_array.shape) == 2:
             # Convert grayscale to RGBA
-            rgb = np.stack([image_array] * 3, axis=2)
-            alpha = np.full(image_array.shape, 255, dtype=np.uint8)
-            image_array = np.dstack([rgb, alpha])
+            image_array = self._to_rgba(image_array, cv2.COLOR_GRAY2RGBA)
         elif len(image_array.shape) == 3:
             if image_array.shape[2] == 3:
                 # Add alpha channel to RGB
-                alpha = np.full(image_array.shape[:2], 255, dtype=np.uint8)
-                image_array = np.dstack([image_array, alpha])
+                image_array = self._to_rgba(image_array, cv2.COLOR_RGB2RGBA)
             # If already RGBA (4 channels), keep as is
         
         return image_array
+    
+    def _memmap_tiff(self, file_path: str) -> Optional[np.ndarray]:
+        """Map an uncompressed 8-bit TIFF read-only, or None if it must be decoded
+        
+        Pages are paged in from disk on first access. RGBA files are returned
+        as the map itself; gray/RGB ones still get one RGBA conversion pass.
+        """
+        try:
+            # Only samples that are already gray, RGB or RGB + straight alpha can
+            # be used as stored; MINISWHITE, palette, YCbCr, CMYK or premultiplied
+            # alpha need decoding
+            with tifffile.TiffFile(file_path) as tif:
+                page = tif.pages[0]
+                if page.photometric not in (tifffile.PHOTOMETRIC.MINISBLACK, tifffile.PHOTOMETRIC.RGB):
+                    return None
+                if any(sample != tifffile.EXTRASAMPLE.UNASSALPHA for sample in page.extrasamples):
+                    return None
+                    
+            image_array = tifffile.memmap(file_path, mode='r')
+        except Exception:
+            # Compressed, tiled or otherwise not stored contiguously
+            return None
+            
+        if image_array.dtype != np.uint8:
+            return None
+        if not (image_array.ndim == 2 or (image_array.ndim == 3 and image_array.shape[2] in (3, 4))):
+            return None
+            
+        # Shared with the file, consumers must not write into it
+        image_array.setflags(write=False)
+        return image_array
+    
+    def _to_rgba(self, image_array: np.ndarray, conversion: int) -> np.ndarray:
+        """Promote a grayscale or 3-channel image to RGBA in a single pass
+        
+        OpenCV writes the output (with an opaque alpha channel) directly; pixel
+        types cvtColor does not support (e.g. bool or int32 TIFFs) fall back
+        to stacking the channels with NumPy.
+        """
+        if image_array.dtype in (np.uint8, np.uint16, np.float32):
+            return cv2.cvtColor(image_array, conversion)
+            
+        if image_array.ndim == 2:
+            image_array = np.stack([image_array] * 3, axis=2)
+        alpha = np.full(image_array.shape[:2], 255, dtype=np.uint8)
+        return np.dstack([image_array, alpha])
 
     
     def _load_standard_image(self, file_path: str) -> np.ndarray:
@@ -155,15 +301,11 @@ class ImageLoader:
         # Handle different channel configurations
         if len(image_array.shape) == 2:
             # Grayscale to RGBA
-            rgb = np.stack([image_array] * 3, axis=2)
-            alpha = np.full(image_array.shape, 255, dtype=np.uint8)
-            image_array = np.dstack([rgb, alpha])
+            image_array = cv2.cvtColor(image_array, cv2.COLOR_GRAY2RGBA)
         elif len(image_array.shape) == 3:
             if image_array.shape[2] == 3:
-                # BGR to RGBA
-                image_array = cv2.cvtColor(image_array, cv2.COLOR_BGR2RGB)
-                alpha = np.full(image_array.shape[:2], 255, dtype=np.uint8)
-                image_array = np.dstack([image_array, alpha])
+                # BGR to RGBA (alpha filled as opaque)
+                image_array = cv2.cvtColor(image_array, cv2.COLOR_BGR2RGBA)
             elif image_array.shape[2] == 4:
                 # BGRA to RGBA
                 image_array = cv2.cvtColor(image_array, cv2.COLOR_BGRA2RGBA)
@@ -172,10 +314,15 @@ class ImageLoader:
     
     def get_image_info(self, file_path: str) -> dict:
         """Get information about an image file"""
+        key = self._file_cache_key(file_path)
+        cached = self._info_cache.get(key)
+        if cached is not None:
+            return {**cached, 'file_path': file_path}
+            
         info = {
             'file_path': file_path,
-            'file_size': os.path.getsize(file_path),
-            'format': os.path.splitext(file_path)[1].lower(),
+            'file_size': key[2],
+            'format': _file_extension(file_path),
             'dimensions': None,
             'levels': 1,
             'pixel_size': None
@@ -205,21 +352,29 @@ class ImageLoader:
                 info['dimensions'] = [(image.width, image.height)]
                 image.close()
                 
+            # Only successful reads are cached
+            self._info_cache[key] = dict(info)
+                
         except Exception as e:
-            print(f"Warning: Could not get info for {file_path}: {e}")
+            self.logger.warning("Could not get info for %s: %s", file_path, e)
             
         return info
     
     def is_pyramidal(self, file_path: str) -> bool:
         """Check if image is pyramidal (multi-resolution)"""
-        file_ext = os.path.splitext(file_path)[1].lower()
+        file_ext = _file_extension(file_path)
         
         if file_ext == '.svs' and OPENSLIDE_AVAILABLE:
             return True
         elif file_ext in {'.tiff', '.tif'}:
             try:
-                with tifffile.TiffFile(file_path) as tif:
-                    return tif.is_pyramidal
+                key = self._file_cache_key(file_path)
+                cached = self._pyr_cache.get(key)
+                if cached is None:
+                    with tifffile.TiffFile(file_path) as tif:
+                        cached = bool(tif.is_pyramidal)
+                    self._pyr_cache[key] = cached
+                return cached
             except:
                 return False
         
@@ -269,7 +424,7 @@ class ImageLoader:
                         info['has_pyramid'] = False
                         
         except Exception as e:
-            print(f"Warning: Could not get pyramid info for {file_path}: {e}")
+            self.logger.warning("Could not get pyramid info for %s: %s", file_path, e)
             # Return minimal info
             info['levels'] = [0]
             info['level_dimensions'] = [(0, 0)]
@@ -2,14 +2,54 @@
 Manager for labeled points and point-based stitching
 """
 
+from contextlib import contextmanager
 from typing import Dict, List, Optional, Tuple
 from PyQt6.QtCore import QObject, pyqtSignal
 import numpy as np
 import math
 
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
 from .labeled_point import LabeledPoint
 from .fragment import Fragment
 
+# Column order of exported point rows (format 1.1), matching LabeledPoint's fields
+_EXPORT_FIELDS = ('id', 'label', 'x', 'y', 'fragment_id')
+
+if NUMBA_AVAILABLE:
+    @njit(fastmath=True, cache=True)
+    def _kabsch2d(rows):
+        """Centroids and Kabsch dot/cross sums of (N, 4) rows of ref x, ref y, target x, target y"""
+        n = rows.shape[0]
+        ref_cx = 0.0
+        ref_cy = 0.0
+        target_cx = 0.0
+        target_cy = 0.0
+        for i in range(n):
+            ref_cx += rows[i, 0]
+            ref_cy += rows[i, 1]
+            target_cx += rows[i, 2]
+            target_cy += rows[i, 3]
+        ref_cx /= n
+        ref_cy /= n
+        target_cx /= n
+        target_cy /= n
+        
+        dot = 0.0
+        cross = 0.0
+        for i in range(n):
+            rx = rows[i, 0] - ref_cx
+            ry = rows[i, 1] - ref_cy
+            tx = rows[i, 2] - target_cx
+            ty = rows[i, 3] - target_cy
+            dot += tx * rx + ty * ry
+            cross += tx * ry - ty * rx
+        return ref_cx, ref_cy, target_cx, target_cy, dot, cross
+
 class PointManager(QObject):
     """Manages labeled points and performs point-based stitching"""
     
@@ -18,19 +58,68 @@ class PointManager(QObject):
     def __init__(self):
         super().__init__()
         self._points: Dict[str, LabeledPoint] = {}  # point_id -> LabeledPoint
-        self._fragment_points: Dict[str, List[str]] = {}  # fragment_id -> [point_ids]
+        # fragment_id -> point ids, as an insertion-ordered set (dict keys) so
+        # removal is O(1) and labels still list in the order they were placed
+        self._fragment_points: Dict[str, Dict[str, None]] = {}
+        self._label_index: Dict[str, Dict[str, str]] = {}  # label -> fragment_id -> point_id
+        self._fragment_labels: Dict[str, Dict[str, str]] = {}  # fragment_id -> label -> point_id
+        
+        # Packed local coordinates of all points for batched coordinate math,
+        # kept in step with every mutation; rows are compacted on removal
+        self._coords: Optional[np.ndarray] = None  # (capacity, 2), allocated on first point
+        self._coord_count = 0
+        self._coord_rows: Dict[str, int] = {}  # point_id -> row in _coords
+        self._row_point_ids: List[str] = []
+        self._row_fragment_ids: List[str] = []
+        
+        # Scratch rows (ref x, ref y, target x, target y) for alignment,
+        # grown on demand and reused across calls
+        self._kabsch_buf: Optional[np.ndarray] = None
+        self._kabsch_centroid = np.empty(4, dtype=np.float64)
+        
+        # Signal batching: while _batch_depth > 0 points_changed is deferred
+        # and emitted once when the outermost batch ends
+        self._batch_depth = 0
+        self._pending_emit = False
+        
+        # Bumped on every mutation; derived views are cached against it
+        self._version = 0
+        self._matching_cache: Optional[Tuple[int, Dict[str, List[str]]]] = None
+        self._all_points_cache: Optional[Tuple[int, List[LabeledPoint]]] = None
+        
+    @contextmanager
+    def batched(self):
+        """Defer points_changed until the block exits"""
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0 and self._pending_emit:
+                self._pending_emit = False
+                self.points_changed.emit()
+                
+    def _emit_changed(self):
+        """Emit points_changed, or defer it while a batch is open"""
+        # Every mutation reports through here, so this is where the version moves
+        self._version += 1
+        if self._batch_depth:
+            self._pending_emit = True
+        else:
+            self.points_changed.emit()
         
     def add_point(self, fragment_id: str, label: str, x: float, y: float) -> str:
         """Add a labeled point to a fragment"""
         # Check if this fragment already has a point with this label
-        existing_points = self.get_fragment_points(fragment_id)
-        for point in existing_points:
-            if point.label == label:
-                # Update existing point position
-                point.x = x
-                point.y = y
-                self.points_changed.emit()
-                return point.id
+        existing_id = self._label_index.get(label, {}).get(fragment_id)
+        if existing_id is not None:
+            # Update existing point position
+            point = self._points[existing_id]
+            point.x = x
+            point.y = y
+            self._coords[self._coord_rows[existing_id]] = (x, y)
+            self._emit_changed()
+            return point.id
         
         # Create new point
         point = LabeledPoint(
@@ -44,13 +133,32 @@ class PointManager(QObject):
         self._points[point.id] = point
         
         # Add to fragment's point list
-        if fragment_id not in self._fragment_points:
-            self._fragment_points[fragment_id] = []
-        self._fragment_points[fragment_id].append(point.id)
+        self._fragment_points.setdefault(fragment_id, {})[point.id] = None
+        self._index_point(point)
+        self._store_coords(point)
         
-        self.points_changed.emit()
+        self._emit_changed()
         return point.id
     
+    def _index_point(self, point: LabeledPoint):
+        """Record a point in the label indexes"""
+        self._label_index.setdefault(point.label, {})[point.fragment_id] = point.id
+        self._fragment_labels.setdefault(point.fragment_id, {})[point.label] = point.id
+    
+    def _unindex_point(self, point: LabeledPoint):
+        """Drop a point from the label indexes, if it is the indexed one"""
+        fragments = self._label_index.get(point.label)
+        if fragments is None or fragments.get(point.fragment_id) != point.id:
+            return
+        del fragments[point.fragment_id]
+        if not fragments:
+            del self._label_index[point.label]
+        
+        labels = self._fragment_labels[point.fragment_id]
+        del labels[point.label]
+        if not labels:
+            del self._fragment_labels[point.fragment_id]
+    
     def remove_point(self, point_id: str):
         """Remove a labeled point"""
         if point_id in self._points:
@@ -59,55 +167,60 @@ class PointManager(QObject):
             
             # Remove from points dict
             del self._points[point_id]
+            self._unindex_point(point)
+            self._drop_coords(point_id)
             
             # Remove from fragment's point list
-            if fragment_id in self._fragment_points:
-                if point_id in self._fragment_points[fragment_id]:
-                    self._fragment_points[fragment_id].remove(point_id)
+            fragment_point_ids = self._fragment_points.get(fragment_id)
+            if fragment_point_ids is not None:
+                fragment_point_ids.pop(point_id, None)
                     
                 # Clean up empty fragment entries
-                if not self._fragment_points[fragment_id]:
+                if not fragment_point_ids:
                     del self._fragment_points[fragment_id]
             
-            self.points_changed.emit()
+            self._emit_changed()
     
     def get_fragment_points(self, fragment_id: str) -> List[LabeledPoint]:
         """Get all points for a fragment"""
-        if fragment_id not in self._fragment_points:
+        point_ids = self._fragment_points.get(fragment_id)
+        if not point_ids:
             return []
         
-        points = []
-        for point_id in self._fragment_points[fragment_id]:
-            if point_id in self._points:
-                points.append(self._points[point_id])
-        
-        return points
+        # One probe per id; None marks an id with no point behind it
+        lookup = self._points.get
+        return [point for point in map(lookup, point_ids) if point is not None]
+    
+    @property
+    def version(self) -> int:
+        """Counter that changes whenever any point is added, moved or removed"""
+        return self._version
+    
+    def get_fragment_labels(self, fragment_id: str) -> List[str]:
+        """Get the labels placed on a fragment, in placement order"""
+        return list(self._fragment_labels.get(fragment_id, ()))
     
     def get_all_points(self) -> List[LabeledPoint]:
-        """Get all labeled points"""
-        return list(self._points.values())
+        """Get all labeled points (a shared snapshot; do not modify it)"""
+        if self._all_points_cache is None or self._all_points_cache[0] != self._version:
+            self._all_points_cache = (self._version, list(self._points.values()))
+        return self._all_points_cache[1]
     
     def get_points_by_label(self, label: str) -> List[LabeledPoint]:
         """Get all points with a specific label"""
         return [point for point in self._points.values() if point.label == label]
     
     def get_matching_labels(self) -> Dict[str, List[str]]:
-        """Get labels that appear on exactly two fragments"""
-        label_fragments = {}  # label -> [fragment_ids]
-        
-        for point in self._points.values():
-            if point.label not in label_fragments:
-                label_fragments[point.label] = []
-            if point.fragment_id not in label_fragments[point.label]:
-                label_fragments[point.label].append(point.fragment_id)
-        
-        # Return only labels that appear on exactly 2 fragments
-        matching_labels = {}
-        for label, fragment_ids in label_fragments.items():
-            if len(fragment_ids) == 2:
-                matching_labels[label] = fragment_ids
+        """Get labels that appear on exactly two fragments (cached until points change)"""
+        if self._matching_cache is not None and self._matching_cache[0] == self._version:
+            return self._matching_cache[1]
         
-        return matching_labels
+        # The index keeps fragments in insertion order, so the first fragment
+        # stays the stitching reference
+        matching = {label: list(fragment_ids) for label, fragment_ids in self._label_index.items()
+                    if len(fragment_ids) == 2}
+        self._matching_cache = (self._version, matching)
+        return matching
     
     def stitch_fragments_by_labels(self, fragments: List[Fragment]) -> Dict[str, dict]:
         """
@@ -119,54 +232,51 @@ class PointManager(QObject):
         if not matching_labels:
             return {}
         
+        # Visit each unordered fragment pair once, oriented by the first label
+        # linking it; all labels the pair shares are solved together below
+        fragment_pairs = {}
+        for frag1_id, frag2_id in matching_labels.values():
+            fragment_pairs.setdefault(frozenset((frag1_id, frag2_id)), (frag1_id, frag2_id))
+        
         transforms = {}
-        processed_pairs = set()
+        affines = {}  # fragment pose -> (linear, translation), shared by all pairs
         
-        for label, fragment_ids in matching_labels.items():
-            if len(fragment_ids) != 2:
-                continue
-                
-            frag1_id, frag2_id = fragment_ids
-            pair_key = tuple(sorted([frag1_id, frag2_id]))
-            
-            if pair_key in processed_pairs:
-                continue
-                
-            processed_pairs.add(pair_key)
-            
-            # Get fragments
-            frag1 = next((f for f in fragments if f.id == frag1_id), None)
-            frag2 = next((f for f in fragments if f.id == frag2_id), None)
-            
-            if not frag1 or not frag2:
+        # World coordinates of every point in one gather-and-apply pass; row 0
+        # of the stacked affines is a zero map for points on absent fragments
+        xy, point_rows, point_fragment_ids = self._point_arrays()
+        fragment_rows = {}
+        linears = [np.zeros((2, 2))]
+        translations = [np.zeros(2)]
+        for fragment in fragments:
+            linear, translation = self._cached_affine(fragment, affines)
+            fragment_rows.setdefault(fragment.id, len(linears))
+            linears.append(linear)
+            translations.append(translation)
+        frag_idx = np.fromiter((fragment_rows.get(fid, 0) for fid in point_fragment_ids),
+                               dtype=np.intp, count=len(point_fragment_ids))
+        world = (np.einsum('nij,nj->ni', np.stack(linears)[frag_idx], xy)
+                 + np.stack(translations)[frag_idx])
+        
+        for frag1_id, frag2_id in fragment_pairs.values():
+            # Both fragments must be among those being stitched
+            if frag1_id not in fragment_rows or frag2_id not in fragment_rows:
                 continue
             
-            # Get all matching points between these fragments
-            frag1_points = self.get_fragment_points(frag1_id)
-            frag2_points = self.get_fragment_points(frag2_id)
+            # Collect matching point rows for every label both fragments share
+            rows1 = []
+            rows2 = []
+            for shared_label in self._fragment_labels.get(frag1_id, ()):
+                label_points = self._label_index[shared_label]
+                if frag2_id not in label_points:
+                    continue
+                rows1.append(point_rows[label_points[frag1_id]])
+                rows2.append(point_rows[label_points[frag2_id]])
             
-            # Find all labels that both fragments share
-            frag1_labels = {p.label for p in frag1_points}
-            frag2_labels = {p.label for p in frag2_points}
-            shared_labels = frag1_labels.intersection(frag2_labels)
-            
-            if not shared_labels:
+            if not rows1:
                 continue
-            
-            # Collect matching point pairs
-            point_pairs = []
-            for shared_label in shared_labels:
-                p1 = next((p for p in frag1_points if p.label == shared_label), None)
-                p2 = next((p for p in frag2_points if p.label == shared_label), None)
                 
-                if p1 and p2:
-                    # Convert to world coordinates
-                    world_p1 = self.local_to_world(p1, frag1)
-                    world_p2 = self.local_to_world(p2, frag2)
-                    point_pairs.append((world_p1, world_p2))
-            
-            if not point_pairs:
-                continue
+            point_pairs = [(tuple(w1), tuple(w2))
+                           for w1, w2 in zip(world[rows1].tolist(), world[rows2].tolist())]
             
             # Compute transformation (use frag1 as reference, transform frag2)
             transform = self.compute_alignment_transform(point_pairs)
@@ -176,32 +286,84 @@ class PointManager(QObject):
         
         return transforms
     
+    def _store_coords(self, point: LabeledPoint):
+        """Write a point's coordinates into the packed array, growing it by doubling"""
+        row = self._coord_rows.get(point.id)
+        if row is None:
+            row = self._coord_count
+            if self._coords is None or row == len(self._coords):
+                grown = np.empty((max(16, 2 * row), 2), dtype=np.float64)
+                if self._coords is not None:
+                    grown[:row] = self._coords[:row]
+                self._coords = grown
+            self._coord_count += 1
+            self._coord_rows[point.id] = row
+            self._row_point_ids.append(point.id)
+            self._row_fragment_ids.append(point.fragment_id)
+        else:
+            self._row_fragment_ids[row] = point.fragment_id
+        self._coords[row] = (point.x, point.y)
+    
+    def _drop_coords(self, point_id: str):
+        """Free a point's row by moving the last row into it"""
+        row = self._coord_rows.pop(point_id, None)
+        if row is None:
+            return
+        last = self._coord_count - 1
+        if row != last:
+            moved_id = self._row_point_ids[last]
+            self._coords[row] = self._coords[last]
+            self._row_point_ids[row] = moved_id
+            self._row_fragment_ids[row] = self._row_fragment_ids[last]
+            self._coord_rows[moved_id] = row
+        self._row_point_ids.pop()
+        self._row_fragment_ids.pop()
+        self._coord_count = last
+    
+    def _point_arrays(self) -> Tuple[np.ndarray, Dict[str, int], List[str]]:
+        """Get (N, 2) local coordinates, point_id -> row and per-row fragment ids"""
+        if self._coords is None:
+            return np.empty((0, 2), dtype=np.float64), self._coord_rows, self._row_fragment_ids
+        return self._coords[:self._coord_count], self._coord_rows, self._row_fragment_ids
+    
     def local_to_world(self, point: LabeledPoint, fragment: Fragment) -> Tuple[float, float]:
         """Convert point from fragment local coordinates to world coordinates"""
-        # Apply fragment's current transformation to the point
-        x, y = point.x, point.y
-        
+        world = self.local_points_to_world(np.array([[point.x, point.y]], dtype=np.float64), fragment)
+        return (float(world[0, 0]), float(world[0, 1]))
+    
+    def local_points_to_world(self, points: np.ndarray, fragment: Fragment) -> np.ndarray:
+        """Convert an (N, 2) array of fragment local coordinates to world coordinates"""
+        linear, translation = self._fragment_affine(fragment)
+        return points @ linear.T + translation
+    
+    def _cached_affine(self, fragment: Fragment, cache: dict) -> Tuple[np.ndarray, np.ndarray]:
+        """Get a fragment's affine from cache, keyed by its pose so a moved fragment misses"""
+        pose = (fragment.x, fragment.y, fragment.rotation,
+                fragment.flip_horizontal, fragment.flip_vertical)
+        affine = cache.get(pose)
+        if affine is None:
+            affine = cache[pose] = self._fragment_affine(fragment)
+        return affine
+    
+    def _fragment_affine(self, fragment: Fragment) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the (2, 2) linear part and translation of a fragment's local->world map"""
         # Apply rotation
         if abs(fragment.rotation) > 0.01:
             angle_rad = math.radians(fragment.rotation)
             cos_a = math.cos(angle_rad)
             sin_a = math.sin(angle_rad)
+            linear = np.array([[cos_a, -sin_a],
+                               [sin_a, cos_a]])
+        else:
+            linear = np.eye(2)
             
-            x_rot = x * cos_a - y * sin_a
-            y_rot = x * sin_a + y * cos_a
-            x, y = x_rot, y_rot
-        
-        # Apply flips
+        # Flips act on the rotated coordinates, i.e. scale the rows
         if fragment.flip_horizontal:
-            x = -x
+            linear[0] = -linear[0]
         if fragment.flip_vertical:
-            y = -y
-        
-        # Apply translation
-        world_x = x + fragment.x
-        world_y = y + fragment.y
-        
-        return (world_x, world_y)
+            linear[1] = -linear[1]
+            
+        return linear, np.array([fragment.x, fragment.y])
     
     def compute_alignment_transform(self, point_pairs: List[Tuple[Tuple[float, float], Tuple[float, float]]]) -> Optional[dict]:
         """
@@ -223,71 +385,116 @@ class PointManager(QObject):
                 'rotation': 0.0
             }
         
-        # Multiple points - compute rigid transformation using least squares
-        ref_points = np.array([pair[0] for pair in point_pairs])
-        target_points = np.array([pair[1] for pair in point_pairs])
-        
-        # Center the points
-        ref_centroid = np.mean(ref_points, axis=0)
-        target_centroid = np.mean(target_points, axis=0)
-        
-        ref_centered = ref_points - ref_centroid
-        target_centered = target_points - target_centroid
-        
-        # Compute rotation using SVD
-        H = target_centered.T @ ref_centered
-        U, S, Vt = np.linalg.svd(H)
-        R = Vt.T @ U.T
+        # Multiple points - compute rigid transformation using least squares.
+        # Closed-form 2D Kabsch: the best rotation taking target onto ref has
+        # angle atan2(sum(t x r), sum(t . r)) over the centered points and is
+        # never a reflection
+        n = len(point_pairs)
+        if n <= 4:
+            # Plain float sums beat array setup for a handful of points
+            ref_cx = sum(r[0] for r, _ in point_pairs) / n
+            ref_cy = sum(r[1] for r, _ in point_pairs) / n
+            target_cx = sum(t[0] for _, t in point_pairs) / n
+            target_cy = sum(t[1] for _, t in point_pairs) / n
+            dot = 0.0
+            cross = 0.0
+            for (r_x, r_y), (t_x, t_y) in point_pairs:
+                rx, ry = r_x - ref_cx, r_y - ref_cy
+                tx, ty = t_x - target_cx, t_y - target_cy
+                dot += tx * rx + ty * ry
+                cross += tx * ry - ty * rx
+        else:
+            buf = self._kabsch_rows(n)
+            buf[:, :2] = [pair[0] for pair in point_pairs]
+            buf[:, 2:] = [pair[1] for pair in point_pairs]
+            
+            if NUMBA_AVAILABLE:
+                ref_cx, ref_cy, target_cx, target_cy, dot, cross = _kabsch2d(buf)
+            else:
+                # Center the points in place
+                centroid = np.mean(buf, axis=0, out=self._kabsch_centroid)
+                ref_cx, ref_cy, target_cx, target_cy = centroid.tolist()
+                np.subtract(buf, centroid, out=buf)
+                
+                # 2x2 cross-covariance as one unoptimized einsum; a BLAS matmul
+                # costs more in dispatch than it saves for such a tiny result
+                h = np.einsum('ni,nj->ij', buf[:, 2:], buf[:, :2], optimize=False)
+                dot = float(h[0, 0] + h[1, 1])
+                cross = float(h[0, 1] - h[1, 0])
         
-        # Ensure proper rotation (det(R) = 1)
-        if np.linalg.det(R) < 0:
-            Vt[-1, :] *= -1
-            R = Vt.T @ U.T
+        angle_rad = math.atan2(cross, dot)
+        rotation_angle = math.degrees(angle_rad)
         
-        # Extract rotation angle
-        rotation_angle = math.degrees(math.atan2(R[1, 0], R[0, 0]))
+        cos_a = math.cos(angle_rad)
+        sin_a = math.sin(angle_rad)
         
-        # Compute translation
-        rotated_target_centroid = R @ target_centroid
-        translation = ref_centroid - rotated_target_centroid
+        # Compute translation: ref centroid minus the rotated target centroid
+        translation_x = ref_cx - (cos_a * target_cx - sin_a * target_cy)
+        translation_y = ref_cy - (sin_a * target_cx + cos_a * target_cy)
         
         return {
-            'translation': (float(translation[0]), float(translation[1])),
+            'translation': (float(translation_x), float(translation_y)),
             'rotation': float(rotation_angle)
         }
     
+    def _kabsch_rows(self, n: int) -> np.ndarray:
+        """Get an (n, 4) view of the alignment scratch buffer, growing it by doubling"""
+        if self._kabsch_buf is None or len(self._kabsch_buf) < n:
+            capacity = max(n, 2 * len(self._kabsch_buf) if self._kabsch_buf is not None else 16)
+            self._kabsch_buf = np.empty((capacity, 4), dtype=np.float64)
+        return self._kabsch_buf[:n]
+    
     def clear_fragment_points(self, fragment_id: str):
         """Clear all points for a fragment"""
         if fragment_id in self._fragment_points:
-            point_ids = self._fragment_points[fragment_id].copy()
-            for point_id in point_ids:
-                self.remove_point(point_id)
+            point_ids = list(self._fragment_points[fragment_id])
+            with self.batched():
+                for point_id in point_ids:
+                    self.remove_point(point_id)
     
     def clear_all_points(self):
         """Clear all points"""
         self._points.clear()
         self._fragment_points.clear()
-        self.points_changed.emit()
+        self._label_index.clear()
+        self._fragment_labels.clear()
+        self._coord_count = 0
+        self._coord_rows.clear()
+        self._row_point_ids.clear()
+        self._row_fragment_ids.clear()
+        self._emit_changed()
     
     def export_points(self) -> dict:
         """Export points for serialization"""
         return {
-            'points': [point.to_dict() for point in self._points.values()],
-            'version': '1.0'
+            'fields': list(_EXPORT_FIELDS),
+            'rows': [[p.id, p.label, p.x, p.y, p.fragment_id] for p in self._points.values()],
+            'version': '1.1'
         }
     
     def import_points(self, data: dict):
         """Import points from serialization"""
-        self.clear_all_points()
-        
-        for point_data in data.get('points', []):
-            point = LabeledPoint.from_dict(point_data)
-            self._points[point.id] = point
+        # One points_changed for the clear and the load together
+        with self.batched():
+            self.clear_all_points()
             
-            # Add to fragment's point list
-            fragment_id = point.fragment_id
-            if fragment_id not in self._fragment_points:
-                self._fragment_points[fragment_id] = []
-            self._fragment_points[fragment_id].append(point.id)
-        
-        self.points_changed.emit()
\ No newline at end of file
+            if 'rows' in data:
+                fields = tuple(data.get('fields', _EXPORT_FIELDS))
+                if fields == _EXPORT_FIELDS:
+                    points = (LabeledPoint(*row) for row in data['rows'])
+                else:
+                    points = (LabeledPoint.from_dict(dict(zip(fields, row))) for row in data['rows'])
+            else:
+                # Format 1.0: one dict per point
+                points = (LabeledPoint.from_dict(point_data) for point_data in data.get('points', []))
+            
+            for point in points:
+                self._points[point.id] = point
+            
+                # Add to fragment's point list
+                fragment_id = point.fragment_id
+                self._fragment_points.setdefault(fragment_id, {})[point.id] = None
+                self._index_point(point)
+                self._store_coords(point)
+            
+            self._emit_changed()
\ No newline at end of file
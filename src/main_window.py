@@ -3,12 +3,15 @@ Main application window for Tissue Fragment Arrangement and Rigid Stitching UI
 """
 
 import os
-import json
-from typing import Dict, List, Optional
+import logging
+import numpy as np
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
 from PyQt6.QtWidgets import (QMainWindow, QWidget, QHBoxLayout, QVBoxLayout, 
                             QSplitter, QMenuBar, QStatusBar, QFileDialog, 
                             QMessageBox, QProgressBar, QLabel)
-from PyQt6.QtCore import Qt, QTimer, pyqtSignal
+from PyQt6.QtCore import Qt, QObject, QRunnable, QThread, QThreadPool, QTimer, pyqtSignal, pyqtSlot
 from PyQt6.QtGui import QAction, QKeySequence
 from PyQt6.QtWidgets import QApplication
 
@@ -23,8 +26,85 @@ from .ui.point_input_dialog import PointInputDialog
 from .ui.export_dialog import ExportDialog
 from .utils.pyramidal_exporter import PyramidalExporter
 from .utils.export_manager import ExportManager
+from .utils.throttle import qthrottled
 from .algorithms.rigid_stitching import RigidStitchingAlgorithm
 
+# File dialog name filters
+_IMAGE_FILE_FILTER = "Image files (*.tiff *.tif *.svs *.png *.jpg)"
+_JSON_FILE_FILTER = "JSON files (*.json)"
+
+# Parsed shortcuts, shared by every action and window in the process
+_KEY_SEQUENCE_CACHE: Dict[object, QKeySequence] = {}
+
+def _key_sequence(shortcut) -> QKeySequence:
+    """Get the QKeySequence for a 'Ctrl+E' string or StandardKey, parsing each once"""
+    sequence = _KEY_SEQUENCE_CACHE.get(shortcut)
+    if sequence is None:
+        sequence = _KEY_SEQUENCE_CACHE[shortcut] = QKeySequence(shortcut)
+    return sequence
+
+class _ImageLoadSignals(QObject):
+    """Carries decode results from pool threads back to the GUI thread"""
+    
+    finished = pyqtSignal(int, object, str)  # file index, image data or None, error message
+
+class _ImageLoadTask(QRunnable):
+    """Decode one image file on a QThreadPool thread"""
+    
+    def __init__(self, index: int, file_path: str, image_loader: ImageLoader,
+                 signals: _ImageLoadSignals):
+        super().__init__()
+        self.index = index
+        self.file_path = file_path
+        self.image_loader = image_loader
+        self.signals = signals
+        
+    def run(self):
+        try:
+            image_data = self.image_loader.load_image(self.file_path)
+        except Exception as e:
+            self.signals.finished.emit(self.index, None, str(e))
+        else:
+            self.signals.finished.emit(self.index, image_data, "")
+
+@dataclass
+class _ImageLoadBatch:
+    """Progress of one load_images_from_paths call"""
+    
+    file_paths: List[str]
+    signals: _ImageLoadSignals
+    names: List[str] = field(default_factory=list)  # display names, one per file
+    results: Dict[int, Tuple[object, str]] = field(default_factory=dict)  # decoded, not yet added
+    next_index: int = 0  # next file to turn into a fragment
+    done: int = 0
+    loaded: int = 0
+    errors: List[str] = field(default_factory=list)
+
+class _StitchWorker(QObject):
+    """Run rigid stitching refinement off the GUI thread"""
+    
+    progress = pyqtSignal(int, int)  # completed stages, total stages
+    done = pyqtSignal(dict)  # refined transforms by fragment id
+    error = pyqtSignal(str)
+    
+    def __init__(self, algorithm: RigidStitchingAlgorithm, fragments: List,
+                 initial_transforms: Dict[str, dict]):
+        super().__init__()
+        self.algorithm = algorithm
+        self.fragments = fragments
+        self.initial_transforms = initial_transforms
+        
+    @pyqtSlot()
+    def run(self):
+        try:
+            refined_transforms = self.algorithm.stitch_fragments(
+                self.fragments, self.initial_transforms, self.progress.emit
+            )
+        except Exception as e:
+            self.error.emit(str(e))
+        else:
+            self.done.emit(refined_transforms)
+
 class MainWindow(QMainWindow):
     """Main application window"""
     
@@ -33,6 +113,7 @@ class MainWindow(QMainWindow):
     
     def __init__(self):
         super().__init__()
+        self.logger = logging.getLogger(__name__)
         self.fragment_manager = FragmentManager()
         self.point_manager = PointManager()
         self.image_loader = ImageLoader()
@@ -40,6 +121,27 @@ class MainWindow(QMainWindow):
         self.pyramidal_exporter = PyramidalExporter()
         self.stitching_algorithm = RigidStitchingAlgorithm()
         
+        # Fragment changes are coalesced into at most one view refresh per
+        # frame, however many fragments_changed signals arrive meanwhile
+        self._refresh_timer = QTimer(self)
+        self._refresh_timer.setSingleShot(True)
+        self._refresh_timer.setInterval(16)
+        self._refresh_timer.timeout.connect(self.update_ui)
+        self._labeled_points_version = -1  # point_manager.version last shown on the canvas
+        
+        # File dialogs, created on first use
+        self._load_dialog: Optional[QFileDialog] = None
+        self._metadata_dialog: Optional[QFileDialog] = None
+        
+        # Message boxes, created on first use and reused with new text
+        self._confirm_box: Optional[QMessageBox] = None
+        self._info_box: Optional[QMessageBox] = None
+        
+        # Rigid stitching in flight, if any
+        self._stitch_thread: Optional[QThread] = None
+        self._stitch_worker: Optional[_StitchWorker] = None
+        self._close_after_stitch = False  # close() was requested mid-stitch
+        
         self.setup_ui()
         self.setup_connections()
         self.setup_menu_bar()
@@ -111,13 +213,19 @@ class MainWindow(QMainWindow):
         
         # Canvas connections
         self.canvas_widget.fragment_selected.connect(self.select_fragment)
-        self.canvas_widget.fragment_moved.connect(self.update_fragment_position)
-        self.canvas_widget.group_moved.connect(self.update_group_position)
+        # Drags emit per mouse move; commit at most one move per frame. Both
+        # signals carry the latest full state, so the collapsed calls lose nothing
+        self._throttled_fragment_move = qthrottled(self.update_fragment_position, timeout=16, parent=self)
+        self._throttled_group_move = qthrottled(self.update_group_position, timeout=16, parent=self)
+        self.canvas_widget.fragment_moved.connect(self._throttled_fragment_move)
+        self.canvas_widget.group_moved.connect(self._throttled_group_move)
+        # Commit a drag's final position on release, before another drag can start
+        self.canvas_widget.drag_finished.connect(self._throttled_fragment_move.flush)
+        self.canvas_widget.drag_finished.connect(self._throttled_group_move.flush)
         self.canvas_widget.point_add_requested.connect(self.add_labeled_point)
         
         # Fragment manager connections
-        self.fragment_manager.fragments_changed.connect(self.update_ui)
-        self.fragment_manager.fragments_changed.connect(self.on_fragments_changed)
+        self.fragment_manager.fragments_changed.connect(self.schedule_refresh)
         self.fragment_manager.group_selection_changed.connect(self.on_group_selection_changed)
         
         # Canvas group selection
@@ -128,6 +236,11 @@ class MainWindow(QMainWindow):
         
     def update_labeled_points(self):
         """Update labeled points display"""
+        # Skip the push when nothing changed since the canvas last got the points
+        version = self.point_manager.version
+        if version == self._labeled_points_version:
+            return
+        self._labeled_points_version = version
         points = self.point_manager.get_all_points()
         self.canvas_widget.update_labeled_points(points)
     
@@ -138,8 +251,7 @@ class MainWindow(QMainWindow):
             return
         
         # Get existing labels for this fragment
-        existing_points = self.point_manager.get_fragment_points(fragment_id)
-        existing_labels = [p.label for p in existing_points]
+        existing_labels = self.point_manager.get_fragment_labels(fragment_id)
         
         # Show point input dialog
         dialog = PointInputDialog(self, existing_labels)
@@ -149,18 +261,25 @@ class MainWindow(QMainWindow):
                 self.point_manager.add_point(fragment_id, label, local_x, local_y)
                 self.status_bar.showMessage(f"Added point '{label}' to {fragment.name}", 2000)
         
-    def on_fragments_changed(self):
-        """Handle fragment changes and update canvas efficiently"""
-        # Update canvas with new fragment data
-        self.canvas_widget.update_fragments(self.fragment_manager.get_all_fragments())
-        
-        # Update control panel for selected fragment
-        selected_fragment = self.fragment_manager.get_selected_fragment()
-        self.control_panel.set_selected_fragment(selected_fragment)
-        
-        # Update toolbar with fragment count
-        fragment_count = len(self.fragment_manager.get_all_fragments())
-        self.toolbar.set_fragment_count(fragment_count)
+    @contextmanager
+    def _view_updates_suspended(self):
+        """Freeze canvas and fragment list painting during a bulk change, then refresh once"""
+        views = (self.canvas_widget, self.fragment_list)
+        for view in views:
+            view.setUpdatesEnabled(False)
+        try:
+            yield
+        finally:
+            for view in views:
+                view.setUpdatesEnabled(True)
+            # Show the final state now rather than a frame later
+            self.update_ui()
+    
+    def schedule_refresh(self):
+        """Queue a UI refresh for fragment changes; repeated calls before it runs are free"""
+        # Not restarted while pending, so a continuous drag still refreshes every frame
+        if not self._refresh_timer.isActive():
+            self._refresh_timer.start()
     
     def on_group_selection_changed(self, fragment_ids: List[str]):
         """Handle group selection changes"""
@@ -169,8 +288,7 @@ class MainWindow(QMainWindow):
         
         # Update control panel
         if fragment_ids:
-            fragments = [self.fragment_manager.get_fragment(fid) for fid in fragment_ids]
-            fragments = [f for f in fragments if f is not None]
+            fragments = self.fragment_manager.get_fragments_bulk(fragment_ids)
             self.control_panel.set_selected_fragments(fragment_ids, fragments)
         else:
             self.control_panel.set_selected_fragment(None)
@@ -187,96 +305,59 @@ class MainWindow(QMainWindow):
         """Setup the menu bar"""
         menubar = self.menuBar()
         
-        # File menu
-        file_menu = menubar.addMenu('&File')
-        
-        load_action = QAction('&Load Images...', self)
-        load_action.setShortcut(QKeySequence.StandardKey.Open)
-        load_action.triggered.connect(self.load_images)
-        file_menu.addAction(load_action)
-        
-        file_menu.addSeparator()
-        
-        export_image_action = QAction('Export &Image...', self)
-        export_image_action.setShortcut(QKeySequence('Ctrl+E'))
-        export_image_action.triggered.connect(self.export_results)
-        file_menu.addAction(export_image_action)
-        
-        export_metadata_action = QAction('Export &Metadata...', self)
-        export_metadata_action.setShortcut(QKeySequence('Ctrl+M'))
-        export_metadata_action.triggered.connect(self.export_metadata)
-        file_menu.addAction(export_metadata_action)
-        
-        file_menu.addSeparator()
-        
-        quit_action = QAction('&Quit', self)
-        quit_action.setShortcut(QKeySequence.StandardKey.Quit)
-        quit_action.triggered.connect(self.close)
-        file_menu.addAction(quit_action)
-        
-        # Edit menu
-        edit_menu = menubar.addMenu('&Edit')
-        
-        # Rectangle selection tool
-        rectangle_select_action = QAction('&Rectangle Selection Tool', self)
-        rectangle_select_action.setShortcut(QKeySequence('Ctrl+Shift+R'))
-        rectangle_select_action.setCheckable(True)
-        rectangle_select_action.toggled.connect(self.toggle_rectangle_selection)
-        self.rectangle_select_action = rectangle_select_action  # Store reference
-        edit_menu.addAction(rectangle_select_action)
-        
-        edit_menu.addSeparator()
-        
-        reset_action = QAction('&Reset All Transforms', self)
-        reset_action.setShortcut(QKeySequence('Ctrl+R'))
-        reset_action.triggered.connect(self.reset_fragments)
-        edit_menu.addAction(reset_action)
-        
-        edit_menu.addSeparator()
-        
-        delete_action = QAction('&Delete Selected Fragment', self)
-        delete_action.setShortcut(QKeySequence.StandardKey.Delete)
-        delete_action.triggered.connect(self.delete_selected_fragment)
-        edit_menu.addAction(delete_action)
-        
-        # View menu
-        view_menu = menubar.addMenu('&View')
-        
-        zoom_fit_action = QAction('Zoom to &Fit', self)
-        zoom_fit_action.setShortcut(QKeySequence('Ctrl+0'))
-        zoom_fit_action.triggered.connect(self.canvas_widget.zoom_to_fit)
-        view_menu.addAction(zoom_fit_action)
-        
-        zoom_100_action = QAction('Zoom &100%', self)
-        zoom_100_action.setShortcut(QKeySequence('Ctrl+1'))
-        zoom_100_action.triggered.connect(self.canvas_widget.zoom_to_100)
-        view_menu.addAction(zoom_100_action)
-        
-        # Tools menu
-        tools_menu = menubar.addMenu('&Tools')
-        
-        stitch_action = QAction('&Rigid Stitching', self)
-        stitch_action.setShortcut(QKeySequence('Ctrl+S'))
-        stitch_action.triggered.connect(self.perform_stitching)
-        tools_menu.addAction(stitch_action)
-        
-        tools_menu.addSeparator()
-        
-        # Point-based stitching tools
-        add_point_action = QAction('&Add Labeled Point', self)
-        add_point_action.setShortcut(QKeySequence('Ctrl+P'))
-        add_point_action.setCheckable(True)
-        add_point_action.toggled.connect(self.toggle_point_adding_mode)
-        tools_menu.addAction(add_point_action)
-        
-        stitch_by_labels_action = QAction('&Stitch Fragments by Labels', self)
-        stitch_by_labels_action.setShortcut(QKeySequence('Ctrl+Shift+S'))
-        stitch_by_labels_action.triggered.connect(self.stitch_by_labels)
-        tools_menu.addAction(stitch_by_labels_action)
-        
-        clear_points_action = QAction('&Clear All Points', self)
-        clear_points_action.triggered.connect(self.clear_all_points)
-        tools_menu.addAction(clear_points_action)
+        # (menu title, [(action text, shortcut, slot, checkable) or None for a separator]);
+        # checkable actions report through toggled, the rest through triggered
+        menu_spec = [
+            ('&File', [
+                ('&Load Images...', QKeySequence.StandardKey.Open, self.load_images, False),
+                None,
+                ('Export &Image...', 'Ctrl+E', self.export_results, False),
+                ('Export &Metadata...', 'Ctrl+M', self.export_metadata, False),
+                None,
+                ('&Quit', QKeySequence.StandardKey.Quit, self.close, False),
+            ]),
+            ('&Edit', [
+                ('&Rectangle Selection Tool', 'Ctrl+Shift+R', self.toggle_rectangle_selection, True),
+                None,
+                ('&Reset All Transforms', 'Ctrl+R', self.reset_fragments, False),
+                None,
+                ('&Delete Selected Fragment', QKeySequence.StandardKey.Delete,
+                 self.delete_selected_fragment, False),
+            ]),
+            ('&View', [
+                ('Zoom to &Fit', 'Ctrl+0', self.canvas_widget.zoom_to_fit, False),
+                ('Zoom &100%', 'Ctrl+1', self.canvas_widget.zoom_to_100, False),
+            ]),
+            ('&Tools', [
+                ('&Rigid Stitching', 'Ctrl+S', self.perform_stitching, False),
+                None,
+                # Point-based stitching tools
+                ('&Add Labeled Point', 'Ctrl+P', self.toggle_point_adding_mode, True),
+                ('&Stitch Fragments by Labels', 'Ctrl+Shift+S', self.stitch_by_labels, False),
+                ('&Clear All Points', None, self.clear_all_points, False),
+            ]),
+        ]
+        
+        actions = {}
+        for title, entries in menu_spec:
+            menu = menubar.addMenu(title)
+            for entry in entries:
+                if entry is None:
+                    menu.addSeparator()
+                    continue
+                text, shortcut, slot, checkable = entry
+                action = QAction(text, self)
+                if shortcut is not None:
+                    action.setShortcut(_key_sequence(shortcut))
+                if checkable:
+                    action.setCheckable(True)
+                    action.toggled.connect(slot)
+                else:
+                    action.triggered.connect(slot)
+                menu.addAction(action)
+                actions[text] = action
+        
+        self.rectangle_select_action = actions['&Rectangle Selection Tool']  # Store reference
         
     def toggle_point_adding_mode(self, enabled: bool):
         """Toggle point adding mode"""
@@ -290,14 +371,14 @@ class MainWindow(QMainWindow):
         """Perform stitching based on labeled points"""
         fragments = self.fragment_manager.get_all_fragments()
         if len(fragments) < 2:
-            QMessageBox.information(self, "Info", "Need at least 2 fragments for stitching")
+            self._inform("Info", "Need at least 2 fragments for stitching")
             return
         
         matching_labels = self.point_manager.get_matching_labels()
         if not matching_labels:
-            QMessageBox.information(self, "Info", 
-                                  "No matching labels found between fragments.\n"
-                                  "Add labeled points with the same label to different fragments first.")
+            self._inform("Info",
+                         "No matching labels found between fragments.\n"
+                         "Add labeled points with the same label to different fragments first.")
             return
         
         self.progress_bar.setVisible(True)
@@ -309,20 +390,17 @@ class MainWindow(QMainWindow):
             transforms = self.point_manager.stitch_fragments_by_labels(fragments)
             
             if not transforms:
-                QMessageBox.information(self, "Info", "No valid transformations computed")
+                self._inform("Info", "No valid transformations computed")
                 return
             
-            # Apply transforms
-            for fragment_id, transform in transforms.items():
-                fragment = self.fragment_manager.get_fragment(fragment_id)
-                if fragment:
-                    # Apply translation
-                    dx, dy = transform['translation']
-                    self.fragment_manager.translate_fragment(fragment_id, dx, dy)
-                    
-                    # Apply rotation
-                    if abs(transform['rotation']) > 0.01:
-                        self.fragment_manager.rotate_fragment(fragment_id, transform['rotation'])
+            # Apply all transforms in one vectorized call (one fragments_changed)
+            fragment_ids = list(transforms)
+            translations = np.array([transforms[fid]['translation'] for fid in fragment_ids],
+                                    dtype=np.float64).reshape(-1, 2)
+            rotations = np.array([transforms[fid]['rotation'] for fid in fragment_ids],
+                                 dtype=np.float64)
+            with self._view_updates_suspended():
+                self.fragment_manager.apply_bulk_transforms(fragment_ids, translations, rotations)
             
             self.status_bar.showMessage(f"Label-based stitching completed - {len(transforms)} fragments aligned", 3000)
             
@@ -331,15 +409,32 @@ class MainWindow(QMainWindow):
         finally:
             self.progress_bar.setVisible(False)
     
+    def _confirm(self, title: str, text: str,
+                 default=QMessageBox.StandardButton.Yes) -> bool:
+        """Ask a Yes/No question on the shared confirmation box"""
+        if self._confirm_box is None:
+            self._confirm_box = QMessageBox(
+                QMessageBox.Icon.Question, "", "",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No, self
+            )
+        self._confirm_box.setWindowTitle(title)
+        self._confirm_box.setText(text)
+        self._confirm_box.setDefaultButton(default)
+        return self._confirm_box.exec() == QMessageBox.StandardButton.Yes
+        
+    def _inform(self, title: str, text: str):
+        """Show a message on the shared information box"""
+        if self._info_box is None:
+            self._info_box = QMessageBox(
+                QMessageBox.Icon.Information, "", "", QMessageBox.StandardButton.Ok, self
+            )
+        self._info_box.setWindowTitle(title)
+        self._info_box.setText(text)
+        self._info_box.exec()
+        
     def clear_all_points(self):
         """Clear all labeled points"""
-        reply = QMessageBox.question(
-            self, "Clear Points", 
-            "Remove all labeled points?",
-            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
-        )
-        
-        if reply == QMessageBox.StandardButton.Yes:
+        if self._confirm("Clear Points", "Remove all labeled points?"):
             self.point_manager.clear_all_points()
             self.status_bar.showMessage("All labeled points cleared", 2000)
         
@@ -378,47 +473,79 @@ class MainWindow(QMainWindow):
         
     def load_images(self):
         """Load tissue fragment images"""
-        file_dialog = QFileDialog()
-        file_dialog.setFileMode(QFileDialog.FileMode.ExistingFiles)
-        file_dialog.setNameFilter("Image files (*.tiff *.tif *.svs *.png *.jpg)")
+        # Built once and reused, which also keeps the last visited directory
+        if self._load_dialog is None:
+            self._load_dialog = QFileDialog(self)
+            self._load_dialog.setFileMode(QFileDialog.FileMode.ExistingFiles)
+            self._load_dialog.setNameFilter(_IMAGE_FILE_FILTER)
+        file_dialog = self._load_dialog
         
         if file_dialog.exec():
             file_paths = file_dialog.selectedFiles()
             self.load_images_from_paths(file_paths)
             
     def load_images_from_paths(self, file_paths: List[str]):
-        """Load images from file paths"""
+        """Load images from file paths, decoding them on the thread pool"""
+        if not file_paths:
+            return
+        
         self.progress_bar.setVisible(True)
         self.progress_bar.setRange(0, len(file_paths))
+        self.progress_bar.setValue(0)
+        self.status_bar.showMessage(f"Loading {len(file_paths)} images...")
+        
+        # Fragments are added on this thread as results arrive
+        # Display names are derived once here, not per progress update
+        batch = _ImageLoadBatch(file_paths=list(file_paths), signals=_ImageLoadSignals(self),
+                                names=[os.path.basename(path) for path in file_paths])
+        batch.signals.finished.connect(
+            lambda index, image_data, error: self._on_image_loaded(batch, index, image_data, error)
+        )
         
-        try:
-            for i, file_path in enumerate(file_paths):
-                self.progress_bar.setValue(i)
-                self.status_bar.showMessage(f"Loading {os.path.basename(file_path)}...")
-                
-                # Load image using image loader
-                image_data = self.image_loader.load_image(file_path)
-                if image_data is not None:
-                    # Create fragment from image
-                    fragment_id = self.fragment_manager.add_fragment_from_image(
-                        image_data, os.path.basename(file_path)
-                    )
-                    
-            self.progress_bar.setValue(len(file_paths))
-            self.status_bar.showMessage(f"Loaded {len(file_paths)} fragments", 3000)
+        pool = QThreadPool.globalInstance()
+        for index, file_path in enumerate(batch.file_paths):
+            pool.start(_ImageLoadTask(index, file_path, self.image_loader, batch.signals))
             
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to load images: {str(e)}")
-        finally:
-            self.progress_bar.setVisible(False)
+    def _on_image_loaded(self, batch: '_ImageLoadBatch', index: int, image_data, error: str):
+        """Add decoded images as fragments, in file order, and finish the batch"""
+        batch.results[index] = (image_data, error)
+        batch.done += 1
+        self.progress_bar.setValue(batch.done)
+        self.status_bar.showMessage(f"Loaded {batch.names[index]} ({batch.done}/{len(batch.names)})")
+        
+        # Keep the fragment order of the file list whatever order decodes finish in
+        # (one fragments_changed per run of in-order results)
+        with self.fragment_manager.batched():
+            while batch.next_index in batch.results:
+                image_data, error = batch.results.pop(batch.next_index)
+                file_path = batch.file_paths[batch.next_index]
+                name = batch.names[batch.next_index]
+                batch.next_index += 1
+                
+                if error:
+                    batch.errors.append(f"{name}: {error}")
+                elif image_data is not None:
+                    try:
+                        # Create fragment from image
+                        self.fragment_manager.add_fragment_from_image(image_data, name, file_path)
+                        batch.loaded += 1
+                    except Exception as e:
+                        batch.errors.append(f"{name}: {str(e)}")
+                        
+        if batch.done < len(batch.file_paths):
+            return
+        
+        self.progress_bar.setVisible(False)
+        batch.signals.deleteLater()
+        self.status_bar.showMessage(f"Loaded {batch.loaded} fragments", 3000)
+        
+        if batch.errors:
+            QMessageBox.critical(self, "Error", "Failed to load images:\n" + "\n".join(batch.errors))
             
     def select_fragment(self, fragment_id: str):
         """Select a fragment"""
+        # The list and control panel follow on the refresh that fragments_changed schedules
         self.fragment_manager.set_selected_fragment(fragment_id)
-        self.fragment_list.set_selected_fragment(fragment_id)
-        self.control_panel.set_selected_fragment(
-            self.fragment_manager.get_fragment(fragment_id)
-        )
         self.canvas_widget.set_selected_fragment(fragment_id)
         
     def toggle_fragment_visibility(self, fragment_id: str, visible: bool):
@@ -431,14 +558,9 @@ class MainWindow(QMainWindow):
         if not fragment:
             return
             
-        reply = QMessageBox.question(
-            self, "Delete Fragment", 
-            f"Are you sure you want to delete fragment '{fragment.name}'?",
-            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
-            QMessageBox.StandardButton.No
-        )
-        
-        if reply == QMessageBox.StandardButton.Yes:
+        if self._confirm("Delete Fragment",
+                         f"Are you sure you want to delete fragment '{fragment.name}'?",
+                         QMessageBox.StandardButton.No):
             self.fragment_manager.remove_fragment(fragment_id)
             self.status_bar.showMessage(f"Fragment '{fragment.name}' deleted", 2000)
             
@@ -454,16 +576,16 @@ class MainWindow(QMainWindow):
         if fragment_id == 'group':
             if transform_type == 'rotate_cw':
                 # value contains fragment_ids
-                print(f"Group rotate CW: {value}")
+                self.logger.debug("Group rotate CW: %s", value)
                 self.fragment_manager.rotate_group(value, 90)
             elif transform_type == 'rotate_ccw':
                 # value contains fragment_ids  
-                print(f"Group rotate CCW: {value}")
+                self.logger.debug("Group rotate CCW: %s", value)
                 self.fragment_manager.rotate_group(value, -90)
             elif transform_type == 'translate':
                 # For group translation, value contains (fragment_ids, (dx, dy))
                 fragment_ids, (dx, dy) = value
-                print(f"Group translate: {fragment_ids}, dx={dx}, dy={dy}")
+                self.logger.debug("Group translate: %s, dx=%s, dy=%s", fragment_ids, dx, dy)
                 self.fragment_manager.translate_group(fragment_ids, dx, dy)
             return  # Important: return early for group operations
         else:
@@ -500,81 +622,120 @@ class MainWindow(QMainWindow):
         x = round(float(x), 2)
         y = round(float(y), 2)
         
+        # Sub-0.01 px drag steps round to the current position: nothing to do
+        fragment = self.fragment_manager.get_fragment(fragment_id)
+        if fragment is None or (fragment.x == x and fragment.y == y):
+            return
+        
         # Check if this fragment is part of a group selection
         selected_ids = self.fragment_manager.get_selected_fragment_ids()
         if len(selected_ids) > 1 and fragment_id in selected_ids:
             # Calculate offset and move entire group
-            fragment = self.fragment_manager.get_fragment(fragment_id)
-            if fragment:
-                dx = x - fragment.x
-                dy = y - fragment.y
-                self.fragment_manager.translate_group(selected_ids, dx, dy)
-                return
+            dx = x - fragment.x
+            dy = y - fragment.y
+            self.fragment_manager.translate_group(selected_ids, dx, dy)
+            return
         
         # Debug output
-        fragment = self.fragment_manager.get_fragment(fragment_id)
-        if fragment:
-            print(f"Updating fragment {fragment.name} position: ({fragment.x}, {fragment.y}) -> ({x}, {y})")
+        self.logger.debug("Updating fragment %s position: (%s, %s) -> (%s, %s)",
+                          fragment.name, fragment.x, fragment.y, x, y)
         
         self.fragment_manager.set_fragment_position(fragment_id, x, y)
         
     def update_group_position(self, fragment_ids: List[str], dx: float, dy: float):
         """Update group position from canvas interaction"""
+        if not dx and not dy:
+            return
         self.fragment_manager.translate_group(fragment_ids, dx, dy)
         
     def perform_stitching(self):
-        """Perform rigid stitching refinement"""
+        """Start rigid stitching refinement on a worker thread"""
+        if self._stitch_thread is not None:
+            return
+            
         fragments = self.fragment_manager.get_all_fragments()
         if len(fragments) < 2:
-            QMessageBox.information(self, "Info", "Need at least 2 fragments for stitching")
+            self._inform("Info", "Need at least 2 fragments for stitching")
             return
             
+        # Use current transforms as initial guesses
+        initial_transforms = {}
+        for fragment in fragments:
+            initial_transforms[fragment.id] = {
+                'rotation': fragment.rotation,
+                'translation': (fragment.x, fragment.y),
+                'flip_horizontal': fragment.flip_horizontal
+            }
+            
         self.progress_bar.setVisible(True)
-        self.progress_bar.setRange(0, 0)  # Indeterminate progress
+        self.progress_bar.setRange(0, 0)  # Indeterminate until the first stage reports
         self.status_bar.showMessage("Performing rigid stitching...")
         
-        try:
-            # Use current transforms as initial guesses
-            initial_transforms = {}
-            for fragment in fragments:
-                initial_transforms[fragment.id] = {
-                    'rotation': fragment.rotation,
-                    'translation': (fragment.x, fragment.y),
-                    'flip_horizontal': fragment.flip_horizontal
-                }
-                
-            # Perform stitching
-            refined_transforms = self.stitching_algorithm.stitch_fragments(
-                fragments, initial_transforms
-            )
-            
-            # Apply refined transforms
+        thread = QThread(self)
+        # The worker reads snapshots, so edits made while it runs never touch
+        # the fragments' transform caches from another thread
+        snapshots = [fragment.snapshot() for fragment in fragments]
+        worker = _StitchWorker(self.stitching_algorithm, snapshots, initial_transforms)
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        worker.progress.connect(self._on_stitch_progress)
+        worker.done.connect(self._apply_refined_transforms)
+        worker.error.connect(self._on_stitch_error)
+        worker.done.connect(thread.quit)
+        worker.error.connect(thread.quit)
+        thread.finished.connect(self._on_stitch_finished)
+        
+        self._stitch_thread = thread
+        self._stitch_worker = worker
+        thread.start()
+        
+    def _on_stitch_progress(self, completed: int, total: int):
+        """Show stitching stage progress"""
+        self.progress_bar.setRange(0, total)
+        self.progress_bar.setValue(completed)
+        
+    def _apply_refined_transforms(self, refined_transforms: Dict[str, dict]):
+        """Apply stitching results (one fragments_changed for the whole batch)"""
+        with self._view_updates_suspended(), self.fragment_manager.batched():
+            # set_fragment_transform skips ids removed while stitching ran
             for fragment_id, transform in refined_transforms.items():
-                fragment = self.fragment_manager.get_fragment(fragment_id)
-                if fragment:
-                    self.fragment_manager.set_fragment_transform(
-                        fragment_id,
-                        rotation=transform['rotation'],
-                        translation=transform['translation'],
-                        flip_horizontal=transform['flip_horizontal']
-                    )
+                self.fragment_manager.set_fragment_transform(
+                    fragment_id,
+                    rotation=transform['rotation'],
+                    translation=transform['translation'],
+                    flip_horizontal=transform['flip_horizontal']
+                )
                     
-            self.status_bar.showMessage("Rigid stitching completed", 3000)
-            
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Stitching failed: {str(e)}")
-        finally:
-            self.progress_bar.setVisible(False)
-            
+        self.status_bar.showMessage("Rigid stitching completed", 3000)
+        
+    def _on_stitch_error(self, message: str):
+        """Report a stitching failure"""
+        self.status_bar.clearMessage()
+        QMessageBox.critical(self, "Error", f"Stitching failed: {message}")
+        
+    def _on_stitch_finished(self):
+        """Release the stitching thread once its event loop has stopped"""
+        self.progress_bar.setVisible(False)
+        self._stitch_worker.deleteLater()
+        self._stitch_thread.deleteLater()
+        self._stitch_worker = None
+        self._stitch_thread = None
+        
+        if self._close_after_stitch:
+            self.close()
+        
+    def closeEvent(self, event):
+        """Defer closing until a running stitch finishes and its thread has stopped"""
+        if self._stitch_thread is not None:
+            self._close_after_stitch = True
+            self.status_bar.showMessage("Closing after rigid stitching finishes...")
+            event.ignore()
+            return
+        super().closeEvent(event)
+        
     def reset_fragments(self):
         """Reset all fragment transformations"""
-        reply = QMessageBox.question(
-            self, "Confirm Reset", 
-            "Reset all fragment transformations to default?",
-            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
-        )
-        
-        if reply == QMessageBox.StandardButton.Yes:
+        if self._confirm("Confirm Reset", "Reset all fragment transformations to default?"):
             self.fragment_manager.reset_all_transforms()
             
     def show_export_dialog(self):
@@ -654,23 +815,25 @@ class MainWindow(QMainWindow):
                 
     def export_metadata(self):
         """Export fragment metadata"""
-        file_dialog = QFileDialog()
-        file_dialog.setAcceptMode(QFileDialog.AcceptMode.AcceptSave)
-        file_dialog.setNameFilter("JSON files (*.json)")
-        file_dialog.setDefaultSuffix("json")
+        if self._metadata_dialog is None:
+            self._metadata_dialog = QFileDialog(self)
+            self._metadata_dialog.setAcceptMode(QFileDialog.AcceptMode.AcceptSave)
+            self._metadata_dialog.setNameFilter(_JSON_FILE_FILTER)
+            self._metadata_dialog.setDefaultSuffix("json")
+        file_dialog = self._metadata_dialog
         
         if file_dialog.exec():
             file_path = file_dialog.selectedFiles()[0]
             try:
                 metadata = self.fragment_manager.export_metadata()
-                with open(file_path, 'w') as f:
-                    json.dump(metadata, f, indent=2)
+                self.export_manager.write_json(metadata, file_path)
                 self.status_bar.showMessage(f"Metadata exported to {file_path}", 3000)
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Export failed: {str(e)}")
                 
     def update_ui(self):
         """Update UI elements when fragments change"""
+        self._refresh_timer.stop()
         fragments = self.fragment_manager.get_all_fragments()
         
         # Update fragment list
@@ -678,21 +841,19 @@ class MainWindow(QMainWindow):
         
         # Update fragment list selection state
         selected_ids = self.fragment_manager.get_selected_fragment_ids()
-        if len(selected_ids) > 1:
+        selection_count = len(selected_ids)
+        if selection_count > 1:
             self.fragment_list.set_selected_fragment_ids(selected_ids)
-        elif len(selected_ids) == 1:
-            self.fragment_list.set_selected_fragment(selected_ids[0])
         else:
-            self.fragment_list.set_selected_fragment(None)
+            self.fragment_list.set_selected_fragment(selected_ids[0] if selection_count else None)
         
         # Update canvas
         self.canvas_widget.update_fragments(fragments)
         
-        # Update status bar
-        self.fragment_count_label.setText(f"Fragments: {len(fragments)}")
+        # Update status bar and toolbar with fragment count
+        fragment_count = len(fragments)
+        self.fragment_count_label.setText(f"Fragments: {fragment_count}")
+        self.toolbar.set_fragment_count(fragment_count)
         
-        # Update control panel if fragment is selected
-        selected_id = self.fragment_manager.get_selected_fragment_id()
-        if selected_id:
-            selected_fragment = self.fragment_manager.get_fragment(selected_id)
-            self.control_panel.set_selected_fragment(selected_fragment)
\ No newline at end of file
+        # Update control panel for selected fragment
+        self.control_panel.set_selected_fragment(self.fragment_manager.get_selected_fragment())
\ No newline at end of file
@@ -5,80 +5,37 @@ High-performance canvas widget for tissue fragment visualization
 import numpy as np
 from typing import List, Optional, Tuple, Dict
 from PyQt6.QtWidgets import QWidget
-from PyQt6.QtCore import Qt, QTimer, pyqtSignal, QPoint, QRect, QThread, QObject
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal, QPoint, QRect
 from PyQt6.QtGui import (QPainter, QPixmap, QImage, QPen, QBrush, QColor, 
                         QMouseEvent, QWheelEvent, QPaintEvent, QResizeEvent, QTransform, QKeyEvent)
 from PyQt6.QtOpenGLWidgets import QOpenGLWidget
 from PyQt6.QtCore import QPointF, QRectF
-import cv2
 
 from ..core.fragment import Fragment
 from ..core.labeled_point import LabeledPoint
 
-class FragmentRenderer(QObject):
-    """Background fragment renderer for better performance"""
+def _ndarray_to_qimage(image: np.ndarray) -> Optional[QImage]:
+    """Wrap an RGB/RGBA uint8 array in a QImage without copying its pixels
     
-    rendering_finished = pyqtSignal(str, QPixmap)  # fragment_id, pixmap
-    
-    def __init__(self):
-        super().__init__()
-        self.render_queue = []
-        
-    def render_fragment(self, fragment: Fragment, zoom: float):
-        """Render a single fragment at the given zoom level"""
-        if fragment.image_data is None:
-            return
-            
-        transformed_image = fragment.get_transformed_image()
-        if transformed_image is None:
-            return
-            
-        # Apply level-of-detail based on zoom
-        if zoom < 0.25:
-            # Very low zoom - use 1/4 resolution
-            scale_factor = 0.25
-        elif zoom < 0.5:
-            # Low zoom - use 1/2 resolution
-            scale_factor = 0.5
-        elif zoom > 4.0:
-            # High zoom - use full resolution
-            scale_factor = 1.0
-        else:
-            # Normal zoom - use full resolution
-            scale_factor = 1.0
-            
-        # Resize if needed for LOD
-        if scale_factor < 1.0:
-            new_height = int(transformed_image.shape[0] * scale_factor)
-            new_width = int(transformed_image.shape[1] * scale_factor)
-            if new_height > 0 and new_width > 0:
-                transformed_image = cv2.resize(transformed_image, (new_width, new_height), 
-                                             interpolation=cv2.INTER_AREA)
-        
-        # Convert to QPixmap
-        height, width = transformed_image.shape[:2]
-        if len(transformed_image.shape) == 3 and transformed_image.shape[2] == 4:
-            # RGBA
-            bytes_per_line = 4 * width
-            q_image = QImage(transformed_image.data, width, height, bytes_per_line, QImage.Format.Format_RGBA8888)
-        else:
-            # Fallback to RGB
-            if len(transformed_image.shape) == 3:
-                bytes_per_line = 3 * width
-                q_image = QImage(transformed_image.data, width, height, bytes_per_line, QImage.Format.Format_RGB888)
-            else:
-                return
-                
-        pixmap = QPixmap.fromImage(q_image)
+    The QImage borrows the array's buffer, so the array is kept alive on it;
+    QPixmap.fromImage makes the one copy that the display needs.
+    """
+    if image.ndim != 3:
+        return None
+    if image.shape[2] == 4:
+        format = QImage.Format.Format_RGBA8888
+    elif image.shape[2] == 3:
+        format = QImage.Format.Format_RGB888
+    else:
+        return None
         
-        # Scale back up if we used LOD
-        if scale_factor < 1.0:
-            original_size = fragment.get_transformed_image().shape[:2]
-            pixmap = pixmap.scaled(original_size[1], original_size[0], 
-                                 Qt.AspectRatioMode.IgnoreAspectRatio, 
-                                 Qt.TransformationMode.FastTransformation)
+    if not image.flags['C_CONTIGUOUS']:
+        image = np.ascontiguousarray(image)
         
-        self.rendering_finished.emit(fragment.id, pixmap)
+    height, width = image.shape[:2]
+    q_image = QImage(image.data, width, height, image.strides[0], format)
+    q_image._np = image
+    return q_image
 
 class CanvasWidget(QWidget):
     """Optimized canvas for tissue fragment display"""
@@ -90,10 +47,20 @@ class CanvasWidget(QWidget):
     group_selected = pyqtSignal(list)  # list of fragment_ids
     group_moved = pyqtSignal(list, float, float)  # fragment_ids, dx, dy
     point_add_requested = pyqtSignal(str, float, float)  # fragment_id, x, y
+    drag_finished = pyqtSignal()  # mouse released after dragging fragments
     
     def __init__(self):
         super().__init__()
         self.fragments: List[Fragment] = []
+        self._frag_by_id: Dict[str, Fragment] = {}  # self.fragments keyed by id
+        
+        # Culling index over visible fragments, in draw order, rebuilt by update_fragments
+        self._cull_fragments: List[Fragment] = []
+        self._cull_rows: Dict[str, int] = {}  # fragment id -> row in _cull_boxes
+        self._cull_boxes = np.empty((0, 4))  # x0, y0, x1, y1 per fragment
+        
+        # Per-fragment (rotation, flip_h, flip_v) -> (cos, sin, sx, sy), checked on use
+        self._xform_cache: Dict[str, Tuple[Tuple[float, bool, bool], Tuple[float, float, float, float]]] = {}
         self.labeled_points: List[LabeledPoint] = []
         self.selected_fragment_id: Optional[str] = None
         self.selected_fragment_ids: List[str] = []  # For group selection
@@ -110,15 +77,15 @@ class CanvasWidget(QWidget):
         self.is_dragging_fragment = False
         self.last_mouse_pos = QPoint()
         self.dragged_fragment_id: Optional[str] = None
-        self.drag_offset = QPoint()
+        self.drag_offset = QPointF()
         
         # Rectangle selection state
         self.is_rectangle_selecting = False
         self.rectangle_selection_enabled = False
         self.point_adding_mode = False
-        self.selection_start_pos = QPoint()
-        self.selection_current_pos = QPoint()
-        self.selection_rect = QRect()
+        self.selection_start_pos = QPointF()
+        self.selection_current_pos = QPointF()
+        self.selection_rect = QRectF()
         
         # Fragment rendering cache
         self.fragment_pixmaps: Dict[str, QPixmap] = {}
@@ -126,8 +93,6 @@ class CanvasWidget(QWidget):
         self.dirty_fragments: set = set()
         
         # Performance settings
-        self.use_lod = True
-        self.lod_threshold = 0.5
         self.max_texture_size = 4096
         
         # Rendering optimization
@@ -139,6 +104,19 @@ class CanvasWidget(QWidget):
         self.selection_rect_color = QColor(74, 144, 226, 100)  # Semi-transparent
         self.selection_rect_border = QColor(74, 144, 226)
         
+        # Labeled point styling
+        self.point_color = QColor(255, 100, 100)  # Red
+        self.point_text_color = QColor(255, 255, 255)  # White
+        
+        # Pens and brushes reused by every paint; widths follow the zoom in paintEvent
+        self._selection_pen = QPen(self.selection_color)
+        self._dash_pen = QPen(self.selection_rect_border)
+        self._dash_pen.setStyle(Qt.PenStyle.DashLine)
+        self._point_pen = QPen(self.point_color)
+        self._text_pen = QPen(self.point_text_color)
+        self._point_brush = QBrush(self.point_color)
+        self._no_brush = QBrush()
+        
         # Update timers
         self.fast_update_timer = QTimer()
         self.fast_update_timer.setSingleShot(True)
@@ -148,10 +126,6 @@ class CanvasWidget(QWidget):
         self.render_timer.setSingleShot(True)
         self.render_timer.timeout.connect(self.render_dirty_fragments)
         
-        # Background renderer
-        self.renderer = FragmentRenderer()
-        self.renderer.rendering_finished.connect(self.on_fragment_rendered)
-        
         # Setup
         self.setMinimumSize(400, 300)
         self.setMouseTracking(True)
@@ -177,20 +151,21 @@ class CanvasWidget(QWidget):
     def update_fragments(self, fragments: List[Fragment]):
         """Update the fragment list and mark for re-rendering"""
         # Find which fragments are new or changed
-        old_fragment_ids = set(f.id for f in self.fragments)
-        new_fragment_ids = set(f.id for f in fragments)
+        old_by_id = self._frag_by_id
+        new_by_id = {f.id: f for f in fragments}
         
         # Remove pixmaps for deleted fragments
-        for fragment_id in old_fragment_ids - new_fragment_ids:
+        for fragment_id in old_by_id.keys() - new_by_id.keys():
             self.fragment_pixmaps.pop(fragment_id, None)
             self.fragment_zoom_cache.pop(fragment_id, None)
+            self._xform_cache.pop(fragment_id, None)
             
         # Always update fragments and check for changes
         for fragment in fragments:
-            old_fragment = next((f for f in self.fragments if f.id == fragment.id), None)
+            old_fragment = old_by_id.get(fragment.id)
             
             # Always mark as dirty if fragment is new or cache is invalid
-            needs_update = (fragment.id not in old_fragment_ids or not fragment.cache_valid)
+            needs_update = (old_fragment is None or not fragment.cache_valid)
             
             # Check for any changes that require re-rendering
             if old_fragment:
@@ -227,8 +202,43 @@ class CanvasWidget(QWidget):
                 self.fragment_zoom_cache.pop(fragment.id, None)
                 
         self.fragments = fragments
+        self._frag_by_id = new_by_id
+        self._rebuild_cull_index()
         self.schedule_render()
         
+    def _rebuild_cull_index(self):
+        """Snapshot the world bounds of visible fragments for paintEvent culling"""
+        self._cull_fragments = [f for f in self.fragments if f.visible]
+        self._cull_rows = {f.id: row for row, f in enumerate(self._cull_fragments)}
+        boxes = np.array([f.get_bounding_box() for f in self._cull_fragments],
+                         dtype=np.float64).reshape(-1, 4)
+        boxes[:, 2:] += boxes[:, :2]
+        self._cull_boxes = boxes
+        
+    def _fragments_in_rect(self, rect: QRectF) -> List[Fragment]:
+        """Visible fragments whose bounds meet rect, in draw order
+        
+        Fragments being dragged are always included, since they move before
+        the next update_fragments refreshes the index.
+        """
+        boxes = self._cull_boxes
+        mask = ((boxes[:, 0] <= rect.right()) & (boxes[:, 2] >= rect.left()) &
+                (boxes[:, 1] <= rect.bottom()) & (boxes[:, 3] >= rect.top()) &
+                (boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1]))
+        
+        if self.is_dragging_fragment and self.dragged_fragment_id:
+            if self.dragged_fragment_id in self.selected_fragment_ids:
+                moving = self.selected_fragment_ids
+            else:
+                moving = (self.dragged_fragment_id,)
+            for fragment_id in moving:
+                row = self._cull_rows.get(fragment_id)
+                if row is not None:
+                    mask[row] = True
+                    
+        fragments = self._cull_fragments
+        return [fragments[row] for row in np.flatnonzero(mask)]
+        
     def set_selected_fragment(self, fragment_id: Optional[str]):
         """Set the selected fragment"""
         if self.selected_fragment_id != fragment_id:
@@ -247,12 +257,17 @@ class CanvasWidget(QWidget):
         self.rectangle_selection_enabled = enabled
         if not enabled:
             self.is_rectangle_selecting = False
-            self.selection_rect = QRect()
+            self.selection_rect = QRectF()
             # Clear any visual selection rectangle
             self.update()
             # Optionally clear group selection when disabling rectangle mode
             # (This will be handled by the main window)
             
+    def schedule_update(self):
+        """Repaint at most once per frame, however many events ask for it"""
+        if not self.fast_update_timer.isActive():
+            self.fast_update_timer.start(16)  # ~60 FPS
+            
     def schedule_render(self, fast: bool = False):
         """Schedule fragment rendering"""
         if fast and (self.is_dragging_fragment or self.is_panning):
@@ -297,50 +312,14 @@ class CanvasWidget(QWidget):
             self.fragment_pixmaps[fragment.id] = pixmap
             self.fragment_zoom_cache[fragment.id] = self.zoom
             
-    def apply_lod(self, image: np.ndarray, zoom: float) -> np.ndarray:
-        """Apply level-of-detail scaling"""
-        if not self.use_lod or zoom >= self.lod_threshold:
-            return image
-            
-        # Calculate appropriate scale factor
-        if zoom < 0.1:
-            scale = 0.25
-        elif zoom < 0.25:
-            scale = 0.5
-        else:
-            scale = 0.75
-            
-        height, width = image.shape[:2]
-        new_height = max(1, int(height * scale))
-        new_width = max(1, int(width * scale))
-        
-        return cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
-        
     def numpy_to_pixmap(self, image: np.ndarray) -> Optional[QPixmap]:
         """Convert numpy array to QPixmap efficiently"""
         if image is None or image.size == 0:
             return None
             
-        height, width = image.shape[:2]
-        
-        # Ensure image is in the right format
-        if not image.flags['C_CONTIGUOUS']:
-            image = np.ascontiguousarray(image)
-            
-        if len(image.shape) == 3:
-            if image.shape[2] == 4:  # RGBA
-                bytes_per_line = 4 * width
-                format = QImage.Format.Format_RGBA8888
-            elif image.shape[2] == 3:  # RGB
-                bytes_per_line = 3 * width
-                format = QImage.Format.Format_RGB888
-            else:
-                return None
-        else:
+        q_image = _ndarray_to_qimage(image)
+        if q_image is None:
             return None
-            
-        # Create QImage
-        q_image = QImage(image.tobytes(), width, height, bytes_per_line, format)
         return QPixmap.fromImage(q_image)
         
     def get_zoom_level(self) -> float:
@@ -361,15 +340,7 @@ class CanvasWidget(QWidget):
             
     def get_fragment_by_id(self, fragment_id: str) -> Optional[Fragment]:
         """Get fragment by ID"""
-        for fragment in self.fragments:
-            if fragment.id == fragment_id:
-                return fragment
-        return None
-        
-    def on_fragment_rendered(self, fragment_id: str, pixmap: QPixmap):
-        """Handle completed fragment rendering"""
-        self.fragment_pixmaps[fragment_id] = pixmap
-        self.update()
+        return self._frag_by_id.get(fragment_id)
         
     def paintEvent(self, event: QPaintEvent):
         """Paint the canvas with optimized rendering"""
@@ -377,6 +348,13 @@ class CanvasWidget(QWidget):
         painter.setRenderHint(QPainter.RenderHint.Antialiasing, False)  # Disable for performance
         painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform, self.zoom > 2.0)
         
+        # Keep cosmetic line widths constant on screen
+        inv_zoom = 1.0 / self.zoom
+        self._selection_pen.setWidthF(self.selection_pen_width * inv_zoom)
+        self._dash_pen.setWidthF(2.0 * inv_zoom)
+        self._point_pen.setWidthF(2.0 * inv_zoom)
+        self._text_pen.setWidthF(inv_zoom)
+        
         # Fill background
         painter.fillRect(self.rect(), self.background_color)
         
@@ -391,15 +369,8 @@ class CanvasWidget(QWidget):
         # Get visible area for culling
         visible_rect = self.get_visible_world_rect()
         
-        # Draw fragments
-        for fragment in self.fragments:
-            if not fragment.visible:
-                continue
-                
-            # Frustum culling
-            if not self.fragment_intersects_rect(fragment, visible_rect):
-                continue
-                
+        # Draw fragments, frustum culled through the index
+        for fragment in self._fragments_in_rect(visible_rect):
             self.draw_fragment(painter, fragment)
             
         # Draw selection outlines
@@ -414,21 +385,19 @@ class CanvasWidget(QWidget):
         
         painter.restore()
         
-    def get_visible_world_rect(self) -> QRect:
+    def get_visible_world_rect(self) -> QRectF:
         """Get the visible world rectangle for culling"""
         # Convert screen rect to world coordinates
-        screen_rect = self.rect()
+        screen_rect = QRectF(self.rect())
         
         top_left = self.screen_to_world(screen_rect.topLeft())
         bottom_right = self.screen_to_world(screen_rect.bottomRight())
         
-        return QRect(top_left, bottom_right)
+        return QRectF(top_left, bottom_right)
         
-    def fragment_intersects_rect(self, fragment: Fragment, rect: QRect) -> bool:
+    def fragment_intersects_rect(self, fragment: Fragment, rect: QRectF) -> bool:
         """Check if fragment intersects with the given rectangle"""
-        bbox = fragment.get_bounding_box()
-        frag_rect = QRect(int(bbox[0]), int(bbox[1]), int(bbox[2]), int(bbox[3]))
-        return frag_rect.intersects(rect)
+        return QRectF(*fragment.get_bounding_box()).intersects(rect)
         
     def draw_fragment(self, painter: QPainter, fragment: Fragment):
         """Draw a single fragment"""
@@ -452,9 +421,8 @@ class CanvasWidget(QWidget):
             
     def draw_selection_outlines(self, painter: QPainter):
         """Draw selection outlines for fragments"""
-        pen = QPen(self.selection_color, self.selection_pen_width / self.zoom)
-        painter.setPen(pen)
-        painter.setBrush(QBrush())
+        painter.setPen(self._selection_pen)
+        painter.setBrush(self._no_brush)
         
         for fragment in self.fragments:
             if not fragment.visible:
@@ -465,9 +433,7 @@ class CanvasWidget(QWidget):
                           fragment.id in self.selected_fragment_ids)
             
             if is_selected:
-                bbox = fragment.get_bounding_box()
-                rect = QRect(int(bbox[0]), int(bbox[1]), int(bbox[2]), int(bbox[3]))
-                painter.drawRect(rect)
+                painter.drawRect(QRectF(*fragment.get_bounding_box()))
     
     def draw_selection_rectangle(self, painter: QPainter):
         """Draw the rectangle selection overlay"""
@@ -478,10 +444,8 @@ class CanvasWidget(QWidget):
         painter.fillRect(self.selection_rect, self.selection_rect_color)
         
         # Draw border
-        pen = QPen(self.selection_rect_border, 2.0 / self.zoom)
-        pen.setStyle(Qt.PenStyle.DashLine)
-        painter.setPen(pen)
-        painter.setBrush(QBrush())
+        painter.setPen(self._dash_pen)
+        painter.setBrush(self._no_brush)
         painter.drawRect(self.selection_rect)
         
     def draw_labeled_points(self, painter: QPainter):
@@ -491,57 +455,68 @@ class CanvasWidget(QWidget):
         
         # Point styling
         point_radius = 8.0 / self.zoom
-        point_color = QColor(255, 100, 100)  # Red
-        text_color = QColor(255, 255, 255)  # White
         
-        painter.setPen(QPen(point_color, 2.0 / self.zoom))
-        painter.setBrush(QBrush(point_color))
+        painter.setPen(self._point_pen)
+        painter.setBrush(self._point_brush)
         
+        # Gather points on visible fragments with their fragment's transform
+        points = []
+        params = []
         for point in self.labeled_points:
-            # Get fragment to convert local to world coordinates
             fragment = self.get_fragment_by_id(point.fragment_id)
             if not fragment or not fragment.visible:
                 continue
+            points.append(point)
+            params.append((point.x, point.y) + self._fragment_xform(fragment) +
+                          (fragment.x, fragment.y))
+        if not points:
+            return
             
-            # Convert point to world coordinates
-            world_x, world_y = self.point_local_to_world(point, fragment)
-            
+        # Convert all points to world coordinates at once
+        x, y, cos_a, sin_a, sx, sy, tx, ty = np.array(params, dtype=np.float64).T
+        world_xs = sx * (x * cos_a - y * sin_a) + tx
+        world_ys = sy * (x * sin_a + y * cos_a) + ty
+        
+        point_pen = self._point_pen
+        text_pen = self._text_pen
+        text_offset = point_radius + 2.0 / self.zoom
+        for point, world_x, world_y in zip(points, world_xs.tolist(), world_ys.tolist()):
             # Draw point circle
             painter.drawEllipse(QPointF(world_x, world_y), point_radius, point_radius)
             
             # Draw label text
-            painter.setPen(QPen(text_color, 1.0 / self.zoom))
-            text_offset = point_radius + 2.0 / self.zoom
+            painter.setPen(text_pen)
             painter.drawText(QPointF(world_x + text_offset, world_y - text_offset), point.label)
             
             # Restore pen for next point
-            painter.setPen(QPen(point_color, 2.0 / self.zoom))
+            painter.setPen(point_pen)
     
+    def _fragment_xform(self, fragment: Fragment) -> Tuple[float, float, float, float]:
+        """(cos, sin, flip_h sign, flip_v sign) of a fragment, cached until its transform changes"""
+        key = (fragment.rotation, fragment.flip_horizontal, fragment.flip_vertical)
+        cached = self._xform_cache.get(fragment.id)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+            
+        if abs(fragment.rotation) > 0.01:
+            angle_rad = np.radians(fragment.rotation)
+            cos_a, sin_a = float(np.cos(angle_rad)), float(np.sin(angle_rad))
+        else:
+            cos_a, sin_a = 1.0, 0.0
+        xform = (cos_a, sin_a,
+                 -1.0 if fragment.flip_horizontal else 1.0,
+                 -1.0 if fragment.flip_vertical else 1.0)
+        self._xform_cache[fragment.id] = (key, xform)
+        return xform
+        
     def point_local_to_world(self, point: LabeledPoint, fragment: Fragment) -> Tuple[float, float]:
         """Convert point from fragment local coordinates to world coordinates"""
-        import math
-        
+        cos_a, sin_a, sx, sy = self._fragment_xform(fragment)
         x, y = point.x, point.y
         
-        # Apply rotation
-        if abs(fragment.rotation) > 0.01:
-            angle_rad = math.radians(fragment.rotation)
-            cos_a = math.cos(angle_rad)
-            sin_a = math.sin(angle_rad)
-            
-            x_rot = x * cos_a - y * sin_a
-            y_rot = x * sin_a + y * cos_a
-            x, y = x_rot, y_rot
-        
-        # Apply flips
-        if fragment.flip_horizontal:
-            x = -x
-        if fragment.flip_vertical:
-            y = -y
-        
-        # Apply translation
-        world_x = x + fragment.x
-        world_y = y + fragment.y
+        # Rotate, flip, then translate
+        world_x = sx * (x * cos_a - y * sin_a) + fragment.x
+        world_y = sy * (x * sin_a + y * cos_a) + fragment.y
         
         return (world_x, world_y)
                 
@@ -563,7 +538,7 @@ class CanvasWidget(QWidget):
                 self.is_rectangle_selecting = True
                 self.selection_start_pos = self.screen_to_world(event.pos())
                 self.selection_current_pos = self.selection_start_pos
-                self.selection_rect = QRect()
+                self.selection_rect = QRectF()
             else:
                 world_pos = self.screen_to_world(event.pos())
                 clicked_fragment = self.get_fragment_at_position(world_pos.x(), world_pos.y())
@@ -574,18 +549,18 @@ class CanvasWidget(QWidget):
                         # Start dragging entire group
                         self.is_dragging_fragment = True
                         self.dragged_fragment_id = clicked_fragment.id
-                        self.drag_offset = QPoint(
-                            int(world_pos.x() - clicked_fragment.x),
-                            int(world_pos.y() - clicked_fragment.y)
+                        self.drag_offset = QPointF(
+                            world_pos.x() - clicked_fragment.x,
+                            world_pos.y() - clicked_fragment.y
                         )
                     else:
                         # Select single fragment and start dragging
                         self.fragment_selected.emit(clicked_fragment.id)
                         self.is_dragging_fragment = True
                         self.dragged_fragment_id = clicked_fragment.id
-                        self.drag_offset = QPoint(
-                            int(world_pos.x() - clicked_fragment.x),
-                            int(world_pos.y() - clicked_fragment.y)
+                        self.drag_offset = QPointF(
+                            world_pos.x() - clicked_fragment.x,
+                            world_pos.y() - clicked_fragment.y
                         )
                 else:
                     # Start panning
@@ -599,29 +574,14 @@ class CanvasWidget(QWidget):
         
     def world_to_fragment_local(self, world_x: float, world_y: float, fragment: Fragment) -> Tuple[float, float]:
         """Convert world coordinates to fragment local coordinates"""
-        import math
+        cos_a, sin_a, sx, sy = self._fragment_xform(fragment)
         
-        # Remove translation
-        x = world_x - fragment.x
-        y = world_y - fragment.y
+        # Remove translation and flips
+        x = sx * (world_x - fragment.x)
+        y = sy * (world_y - fragment.y)
         
-        # Remove flips
-        if fragment.flip_horizontal:
-            x = -x
-        if fragment.flip_vertical:
-            y = -y
-        
-        # Remove rotation
-        if abs(fragment.rotation) > 0.01:
-            angle_rad = math.radians(-fragment.rotation)  # Negative to reverse
-            cos_a = math.cos(angle_rad)
-            sin_a = math.sin(angle_rad)
-            
-            x_rot = x * cos_a - y * sin_a
-            y_rot = x * sin_a + y * cos_a
-            x, y = x_rot, y_rot
-        
-        return (x, y)
+        # Remove rotation (rotate by the negative angle)
+        return (x * cos_a + y * sin_a, y * cos_a - x * sin_a)
         
     def mouseMoveEvent(self, event: QMouseEvent):
         """Handle mouse move events"""
@@ -630,17 +590,19 @@ class CanvasWidget(QWidget):
             self.selection_current_pos = self.screen_to_world(event.pos())
             
             # Calculate rectangle
-            top_left = QPoint(
+            top_left = QPointF(
                 min(self.selection_start_pos.x(), self.selection_current_pos.x()),
                 min(self.selection_start_pos.y(), self.selection_current_pos.y())
             )
-            bottom_right = QPoint(
+            bottom_right = QPointF(
                 max(self.selection_start_pos.x(), self.selection_current_pos.x()),
                 max(self.selection_start_pos.y(), self.selection_current_pos.y())
             )
             
-            self.selection_rect = QRect(top_left, bottom_right)
-            self.update()
+            # Repaint only the band's old and new extent, in screen space
+            previous_rect = self.selection_rect
+            self.selection_rect = QRectF(top_left, bottom_right)
+            self.update_world_rect(self.selection_rect.united(previous_rect))
             
         elif self.is_dragging_fragment and self.dragged_fragment_id:
             # Move fragment
@@ -663,7 +625,7 @@ class CanvasWidget(QWidget):
                 # Move single fragment
                 self.fragment_moved.emit(self.dragged_fragment_id, new_x, new_y)
             
-            self.update()  # Just update display, don't re-render
+            self.schedule_update()  # Just update display, don't re-render
             
         elif self.is_panning:
             # Pan viewport
@@ -671,7 +633,7 @@ class CanvasWidget(QWidget):
             self.pan_x += delta.x() / self.zoom
             self.pan_y += delta.y() / self.zoom
             self.viewport_changed.emit(self.zoom, self.pan_x, self.pan_y)
-            self.update()
+            self.schedule_update()
             
         self.last_mouse_pos = event.pos()
         
@@ -689,8 +651,7 @@ class CanvasWidget(QWidget):
                     if not fragment.visible:
                         continue
                     
-                    bbox = fragment.get_bounding_box()
-                    frag_rect = QRect(int(bbox[0]), int(bbox[1]), int(bbox[2]), int(bbox[3]))
+                    frag_rect = QRectF(*fragment.get_bounding_box())
                     
                     if self.selection_rect.intersects(frag_rect):
                         selected_fragments.append(fragment.id)
@@ -699,9 +660,12 @@ class CanvasWidget(QWidget):
                 if selected_fragments:
                     self.group_selected.emit(selected_fragments)
             
-            self.selection_rect = QRect()
+            self.selection_rect = QRectF()
             self.update()
         
+        if self.is_dragging_fragment:
+            self.drag_finished.emit()
+            
         self.is_panning = False
         self.is_dragging_fragment = False
         self.dragged_fragment_id = None
@@ -709,7 +673,7 @@ class CanvasWidget(QWidget):
     def wheelEvent(self, event: QWheelEvent):
         """Handle mouse wheel events for zooming"""
         # Get mouse position in world coordinates before zoom
-        mouse_world_before = self.screen_to_world(event.position().toPoint())
+        mouse_world_before = self.screen_to_world(event.position())
         
         # Calculate zoom factor
         zoom_factor = 1.2 if event.angleDelta().y() > 0 else 1.0 / 1.2
@@ -719,12 +683,12 @@ class CanvasWidget(QWidget):
             self.zoom = new_zoom
             
             # Adjust pan to keep mouse position fixed
-            mouse_world_after = self.screen_to_world(event.position().toPoint())
+            mouse_world_after = self.screen_to_world(event.position())
             self.pan_x += float(mouse_world_before.x() - mouse_world_after.x())
             self.pan_y += float(mouse_world_before.y() - mouse_world_after.y())
             
             # Just update the display - don't re-render fragments for zoom changes
-            self.update()
+            self.schedule_update()
             
             self.viewport_changed.emit(self.zoom, self.pan_x, self.pan_y)
             
@@ -733,13 +697,19 @@ class CanvasWidget(QWidget):
         super().resizeEvent(event)
         self.update()
         
-    def screen_to_world(self, screen_pos: QPoint) -> QPoint:
-        """Convert screen coordinates to world coordinates"""
-        world_x = (screen_pos.x() / self.zoom) - self.pan_x
-        world_y = (screen_pos.y() / self.zoom) - self.pan_y
-        return QPoint(int(world_x), int(world_y))
+    def screen_to_world(self, screen_pos) -> QPointF:
+        """Convert screen coordinates (QPoint or QPointF) to sub-pixel world coordinates"""
+        inv_zoom = 1.0 / self.zoom
+        return QPointF(screen_pos.x() * inv_zoom - self.pan_x,
+                       screen_pos.y() * inv_zoom - self.pan_y)
+        
+    def update_world_rect(self, world_rect: QRectF):
+        """Schedule a repaint clipped to a world-space rectangle, plus the pen margin"""
+        top_left = self.world_to_screen(world_rect.topLeft())
+        bottom_right = self.world_to_screen(world_rect.bottomRight())
+        self.update(QRect(top_left, bottom_right).normalized().adjusted(-2, -2, 2, 2))
         
-    def world_to_screen(self, world_pos: QPoint) -> QPoint:
+    def world_to_screen(self, world_pos) -> QPoint:
         """Convert world coordinates to screen coordinates"""
         screen_x = (world_pos.x() + self.pan_x) * self.zoom
         screen_y = (world_pos.y() + self.pan_y) * self.zoom
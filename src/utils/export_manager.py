@@ -11,6 +11,12 @@ import tifffile
 from PIL import Image
 import logging
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 from ..core.fragment import Fragment
 
 class ExportManager:
@@ -243,8 +249,7 @@ class ExportManager:
                 metadata['fragments'].append(fragment_data)
                 
             # Save metadata
-            with open(output_path, 'w') as f:
-                json.dump(metadata, f, indent=2)
+            self.write_json(metadata, output_path)
                 
             self.logger.info("Metadata exported successfully")
             
@@ -252,6 +257,16 @@ class ExportManager:
             self.logger.error(f"Failed to export metadata: {str(e)}")
             raise
             
+    def write_json(self, data, output_path: str):
+        """Write data as 2-space indented JSON, through orjson's C encoder when available"""
+        if ORJSON_AVAILABLE:
+            options = orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+            with open(output_path, 'wb') as f:
+                f.write(orjson.dumps(data, option=options))
+        else:
+            with open(output_path, 'w') as f:
+                json.dump(data, f, indent=2)
+            
     def get_timestamp(self) -> str:
         """Get current timestamp string"""
         from datetime import datetime
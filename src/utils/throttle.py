@@ -0,0 +1,48 @@
+"""
+Rate limiting for high-frequency Qt signal handlers
+"""
+
+from typing import Callable, Optional
+from PyQt6.QtCore import QObject, QTimer
+
+class QThrottled(QObject):
+    """Callable that runs func at most once per timeout ms, on the leading and trailing edge
+    
+    The first call runs at once; later calls inside the window collapse to the
+    latest arguments, which run when it expires, so a burst's final value
+    (e.g. a drag's resting position) is always delivered.
+    """
+    
+    def __init__(self, func: Callable, timeout: int = 16, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self._func = func
+        self._pending_args: Optional[tuple] = None
+        
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(timeout)
+        self._timer.timeout.connect(self._on_timeout)
+    
+    def __call__(self, *args):
+        if self._timer.isActive():
+            self._pending_args = args
+            return
+        self._timer.start()
+        self._func(*args)
+    
+    def _on_timeout(self):
+        """Run the latest collapsed call, keeping the window open while calls keep coming"""
+        if self._pending_args is not None:
+            args, self._pending_args = self._pending_args, None
+            self._timer.start()
+            self._func(*args)
+    
+    def flush(self):
+        """Run any pending call now"""
+        self._timer.stop()
+        self._on_timeout()
+        self._timer.stop()
+
+def qthrottled(func: Callable, timeout: int = 16, parent: Optional[QObject] = None) -> QThrottled:
+    """Wrap func so it runs at most once every timeout ms, always delivering the last call"""
+    return QThrottled(func, timeout, parent)
@@ -0,0 +1,74 @@
+"""
+Tests for the rigid stitching optimizer
+"""
+
+import cv2
+import numpy as np
+import pytest
+
+from src.algorithms.rigid_stitching import RigidStitchingAlgorithm
+from src.core.fragment import Fragment
+
+
+def make_scene(seed: int = 0) -> np.ndarray:
+    """A 400x1000 RGB image of random shapes with plenty of SIFT features"""
+    rng = np.random.default_rng(seed)
+    scene = np.full((400, 1000, 3), 255, dtype=np.uint8)
+    for _ in range(600):
+        color = tuple(int(v) for v in rng.integers(0, 255, 3))
+        x, y = int(rng.integers(0, 1000)), int(rng.integers(0, 400))
+        if rng.random() < 0.5:
+            cv2.circle(scene, (x, y), int(rng.integers(3, 15)), color, -1)
+        else:
+            cv2.rectangle(scene, (x, y), (x + int(rng.integers(4, 20)), y + int(rng.integers(4, 20))), color, -1)
+    return scene
+
+
+@pytest.fixture
+def translated_pair():
+    """Two fragments overlapping by 100 px, the second offset by (600, 0) and placed roughly"""
+    scene = make_scene()
+    reference = Fragment(image_data=np.ascontiguousarray(scene[:, :700]))
+    moving = Fragment(image_data=np.ascontiguousarray(scene[:, 600:]))
+    moving.x, moving.y = 620.0, 15.0
+    initial = {
+        f.id: {'translation': (f.x, f.y), 'rotation': 0.0, 'flip_horizontal': False}
+        for f in (reference, moving)
+    }
+    return reference, moving, initial
+
+
+def test_pure_translation_keeps_reference_fixed(translated_pair):
+    reference, moving, initial = translated_pair
+    result = RigidStitchingAlgorithm().stitch_fragments([reference, moving], initial)
+
+    # The larger fragment anchors the layout and must not move at all
+    assert result[reference.id]['translation'] == (0.0, 0.0)
+    assert result[reference.id]['rotation'] == 0.0
+
+    rotation = (result[moving.id]['rotation'] + 180.0) % 360.0 - 180.0
+    assert rotation == pytest.approx(0.0, abs=0.05)
+    assert np.allclose(result[moving.id]['translation'], (600.0, 0.0), atol=0.5)
+
+
+def test_rotation_is_about_fragment_origin():
+    """The centroid pivot used by the solver is undone: world = R p + t about the top-left"""
+    scene = make_scene()
+    angle = 3.0
+    cos_a, sin_a = np.cos(np.radians(angle)), np.sin(np.radians(angle))
+    to_scene = np.array([[cos_a, -sin_a, 600.0], [sin_a, cos_a, 0.0]])
+
+    reference = Fragment(image_data=np.ascontiguousarray(scene[:, :700]))
+    moving = Fragment(image_data=cv2.warpAffine(
+        scene, to_scene, (380, 380), flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+        borderMode=cv2.BORDER_CONSTANT, borderValue=(255, 255, 255)
+    ))
+    moving.x, moving.y = 610.0, 10.0
+    initial = {
+        f.id: {'translation': (f.x, f.y), 'rotation': 0.0, 'flip_horizontal': False}
+        for f in (reference, moving)
+    }
+    result = RigidStitchingAlgorithm().stitch_fragments([reference, moving], initial)
+
+    assert result[moving.id]['rotation'] == pytest.approx(angle, abs=0.05)
+    assert np.allclose(result[moving.id]['translation'], to_scene[:, 2], atol=0.5)